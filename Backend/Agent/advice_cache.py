@@ -0,0 +1,67 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class AdviceCache:
+    '''
+    Cache of the user independent part of an advice, the tool results it was built from, keyed on
+    the analysed profile and the query embedding.
+
+    A lookup hits when an entry has the same profile, was produced from the same fund dataset
+    version, is younger than the TTL and its query embedding has a cosine similarity of at least
+    the threshold. Entries are evicted least recently used first.
+    '''
+    def __init__(self, capacity: int = 256, ttl: float = 3600, threshold: float = 0.95):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, dataset_version: str):
+        now = time.monotonic()
+        stale = [entry_id for entry_id, entry in self._entries.items()
+                 if now - entry["created_at"] > self.ttl or entry["dataset_version"] != dataset_version]
+        for entry_id in stale:
+            del self._entries[entry_id]
+
+    def lookup(self, profile_key: str, embedding, dataset_version: str):
+        '''Cached value for a similar query with the same profile, None on a miss.'''
+        query = self._unit(embedding)
+        with self._lock:
+            self._expire(dataset_version)
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry["profile_key"] == profile_key]
+            if candidates:
+                similarities = np.stack([entry["embedding"] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry["value"]
+            self.misses += 1
+            return None
+
+    def store(self, profile_key: str, embedding, value, dataset_version: str):
+        with self._lock:
+            self._entries[self._next_id] = {
+                "profile_key": profile_key,
+                "embedding": self._unit(embedding),
+                "value": value,
+                "dataset_version": dataset_version,
+                "created_at": time.monotonic(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
@@ -0,0 +1,67 @@
+import sqlite3
+import threading
+import time
+
+
+class AdviceIndex:
+    '''
+    Latest finance advice of each user plus a bounded history, stored in SQLite.
+
+    Looking up the previous advice is a primary key read instead of a vector search over memories.
+    An empty advice is a negative entry for a user known to have none, it is not kept in the history.
+    '''
+    def __init__(self, path: str, history_size: int = 10):
+        self.history_size = history_size
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS latest_advice ("
+            "userid TEXT PRIMARY KEY, advice TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS advice_history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, userid TEXT NOT NULL, advice TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS advice_history_user ON advice_history (userid, created_at)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def record(self, userid, advice: str, created_at: float = None):
+        created_at = created_at or time.time()
+        userid = str(userid)
+        # A negative entry never replaces advice recorded in the meantime
+        on_conflict = (
+            "DO UPDATE SET advice = excluded.advice, created_at = excluded.created_at "
+            "WHERE excluded.created_at >= latest_advice.created_at"
+        ) if advice else "DO NOTHING"
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO latest_advice (userid, advice, created_at) VALUES (?, ?, ?) "
+                f"ON CONFLICT(userid) {on_conflict}",
+                (userid, advice, created_at)
+            )
+            if advice:
+                self._db.execute(
+                    "INSERT INTO advice_history (userid, advice, created_at) VALUES (?, ?, ?)",
+                    (userid, advice, created_at)
+                )
+                self._db.execute(
+                    "DELETE FROM advice_history WHERE userid = ? AND id NOT IN ("
+                    "SELECT id FROM advice_history WHERE userid = ? ORDER BY created_at DESC, id DESC LIMIT ?)",
+                    (userid, userid, self.history_size)
+                )
+            self._db.commit()
+
+    def latest(self, userid):
+        '''Latest advice of the user, empty if the user has none, None if the user is not indexed yet.'''
+        with self._lock:
+            row = self._db.execute("SELECT advice FROM latest_advice WHERE userid = ?", (str(userid),)).fetchone()
+        return row[0] if row else None
+
+    def history(self, userid, limit: int = None):
+        '''Advice of the user, newest first.'''
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT advice, created_at FROM advice_history WHERE userid = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                (str(userid), limit or self.history_size)
+            ).fetchall()
+        return [{"advice": advice, "created_at": created_at} for advice, created_at in rows]
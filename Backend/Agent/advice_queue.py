@@ -0,0 +1,98 @@
+import json
+import sqlite3
+import threading
+import time
+import logging
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    '''
+    Durable queue of memory writes processed by a background worker.
+
+    Items are stored in SQLite before put() returns, so writes queued before a restart are
+    processed once the worker starts again. A failed item is retried with exponential backoff
+    and marked as failed after max_attempts.
+
+    The handler is called as handler(userid, payload, state, checkpoint). state is a dictionary
+    persisted with the item, and checkpoint() saves it, so a retry resumes after the steps that
+    already succeeded instead of repeating them.
+    '''
+    def __init__(self, path: str, handler, max_attempts: int = 5, backoff: float = 2.0):
+        self.handler = handler
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, userid TEXT NOT NULL, payload TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL, failed INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, state TEXT NOT NULL DEFAULT '{}')"
+        )
+        # Queues created before progress was tracked
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(pending)")]
+        if "state" not in columns:
+            self._db.execute("ALTER TABLE pending ADD COLUMN state TEXT NOT NULL DEFAULT '{}'")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._worker = None
+
+    def put(self, userid, payload):
+        now = time.time()
+        with self._wakeup:
+            self._db.execute(
+                "INSERT INTO pending (userid, payload, next_attempt, created_at) VALUES (?, ?, ?, ?)",
+                (str(userid), json.dumps(payload), now, now)
+            )
+            self._db.commit()
+            self._wakeup.notify()
+
+    def pending(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM pending WHERE failed = 0").fetchone()[0]
+
+    def start(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="advice-write-behind", daemon=True)
+                self._worker.start()
+
+    def _next(self):
+        with self._wakeup:
+            while True:
+                row = self._db.execute(
+                    "SELECT id, userid, payload, attempts, next_attempt, state FROM pending "
+                    "WHERE failed = 0 ORDER BY next_attempt, id LIMIT 1"
+                ).fetchone()
+                now = time.time()
+                if row and row[4] <= now:
+                    return row
+                self._wakeup.wait(timeout=(row[4] - now) if row else None)
+
+    def _checkpoint(self, item_id, state):
+        with self._lock:
+            self._db.execute("UPDATE pending SET state = ? WHERE id = ?", (json.dumps(state), item_id))
+            self._db.commit()
+
+    def _run(self):
+        while True:
+            item_id, userid, payload, attempts, _, state = self._next()
+            state = json.loads(state)
+            try:
+                self.handler(userid, json.loads(payload), state, partial(self._checkpoint, item_id, state))
+                with self._lock:
+                    self._db.execute("DELETE FROM pending WHERE id = ?", (item_id,))
+                    self._db.commit()
+            except Exception as e:
+                attempts += 1
+                failed = attempts >= self.max_attempts
+                logger.error(f"Memory write {item_id} failed (attempt {attempts}): {e}")
+                with self._lock:
+                    self._db.execute(
+                        "UPDATE pending SET attempts = ?, next_attempt = ?, failed = ? WHERE id = ?",
+                        (attempts, time.time() + self.backoff ** attempts, int(failed), item_id)
+                    )
+                    self._db.commit()
@@ -1,14 +1,22 @@
 import json
 import os
-from google import genai
 from google.genai import types
 import getkb
+import tool_results
+import memory_service
+import llm_client
+import advice_queue
+import tag_index
+import advice_index
+import advice_cache
+import profile_cache
 from pydantic import BaseModel
 from typing import List
 from dotenv import load_dotenv
-from mem0 import Memory
-from mem0.configs.base import MemoryConfig, LlmConfig, EmbedderConfig, VectorStoreConfig
 import logging
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dateutil.parser import parse
 
 from google.genai.types import FunctionCall,FunctionResponse
@@ -30,24 +38,37 @@ get_mutual_funds_set_declaration = {
                     "type": "string"  # Fixed: was "STRING", should be "string"
                 },
                 "description": "Array of fund types (like 'Large Cap Funds', 'Multi Cap Funds') obtained from details_to_types tool to get specific fund recommendations"
+            },
+            "match": {
+                "type": "string",
+                "enum": ["any", "all"],
+                "description": "'any' returns funds with at least one of the tags, 'all' returns funds with every tag. Defaults to 'any'."
+            },
+            "top_k": {
+                "type": "integer",
+                "description": "Number of best ranked funds to return, between 1 and 50. Defaults to 10."
             }
         },
         "required": ["tags"]
     }
 }
 
-def get_mutual_funds_set(tags: List[str]) -> List[dict[str, str]]:
+TOP_K_FUNDS = int(os.getenv("TOP_K_FUNDS","10"))
+
+def get_mutual_funds_set(tags: List[str], match: str = "any", top_k: int = TOP_K_FUNDS) -> List[dict[str, str]]:
     '''
-    Get details of mutual funds using tags specified like equity or debt.
+    Get the best ranked mutual funds using tags specified like equity or debt.
 
     Args:
         tags: List of tags used for accessing mutual funds
+        match: "any" for funds with at least one tag, "all" for funds with every tag
+        top_k: Number of best ranked funds to return
 
     Returns:
-        List of dictionaries of data consisting of details
+        List of dictionaries of data consisting of details and a ranking score, best first
     '''
     try:
-        mutual_list = getkb.obtain_mutual_funds(tags)
+        mutual_list = getkb.obtain_top_funds(tags, match, int(top_k))
         return mutual_list
     except Exception as e:
         logger.error(f"Error getting mutual funds: {e}")
@@ -159,8 +180,7 @@ class Userbehav(BaseModel):
     risk_tolerance:str
     time_horizon:str
 
-def analyze_user_profile(query):
-    system_prompt = f'''
+PROFILE_PROMPT = '''
     You are a professional psychologist who analyzes human emotions to provide insights on an individuals risk mindset and also analyse the duration of funds.
 
     #Guidelines
@@ -197,30 +217,34 @@ def analyze_user_profile(query):
       - Example: "for the next 10 years" - long term
       - Example: "immediate" - short term
     '''
-    client = genai.Client()
-    config = types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_budget=-1  # Dynamic thinking
-        ),
-        response_mime_type="application/json",
-        response_schema=Userbehav
-    )
+
+PROFILE_CACHE_PATH = os.getenv("PROFILE_CACHE_PATH") or None
+profile_memo = profile_cache.ProfileCache(
+    profile_cache.cache_version(PROFILE_PROMPT, llm_client.MODEL, json.dumps(Userbehav.model_json_schema(), sort_keys=True)),
+    capacity=int(os.getenv("PROFILE_CACHE_SIZE","1024")),
+    path=PROFILE_CACHE_PATH
+)
+
+def analyze_user_profile(query):
+    cached = profile_memo.get(query)
+    if cached is not None:
+        return Userbehav(**cached)
+
+    config = llm_client.json_config(Userbehav)
     
     contents = [
         types.Content(
-            role="user", parts=[types.Part(text=f"{system_prompt}")]
+            role="user", parts=[types.Part(text=PROFILE_PROMPT)]
         ),
         types.Content(
             role="user", parts=[types.Part(text=f"{query}")]
         )
     ]
-    response = client.models.generate_content(
-    model="gemini-2.5-flash",
-    contents=contents,
-    config=config
-    )
+    response = llm_client.generate(contents, config)
 
     retval:Userbehav = response.parsed
+    if retval is not None:
+        profile_memo.put(query, retval.model_dump())
     return retval
 
 def key_finance_advice(advice):
@@ -269,14 +293,7 @@ def key_finance_advice(advice):
     - You must summarise the Reasoning in 1-2 lines.
     - You must return the finance advice in the same language as the input.
     '''
-    client = genai.Client()
-    config = types.GenerateContentConfig(
-        thinking_config=types.ThinkingConfig(
-            thinking_budget=-1  # Dynamic thinking
-        ),
-        response_mime_type="application/json",
-    )
-    
+    config = llm_client.json_config()
     
     contents = [
         types.Content(
@@ -287,11 +304,7 @@ def key_finance_advice(advice):
         )
     ]
     
-    response = client.models.generate_content(
-    model="gemini-2.5-flash",
-    contents=contents,
-    config=config
-    )
+    response = llm_client.generate(contents, config)
 
     candidate = response.candidates[0]
     if candidate and candidate.content and candidate.content.parts:
@@ -314,53 +327,91 @@ def call_tool(name, args):
         logger.error(f"Error calling tool {name}: {e}")
         return {"error": f"Error executing {name}: {str(e)}"}
 
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT","30"))
+TOOL_TIMEOUTS = {
+    "details_to_types": 5,
+}
+# Longest a call may wait for a free worker before it is given up without running
+TOOL_QUEUE_TIMEOUT = float(os.getenv("TOOL_QUEUE_TIMEOUT","60"))
+tool_executor = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_WORKERS","4")), thread_name_prefix="tool")
+
+def tool_key(name, args):
+    '''Key identifying a tool call regardless of argument order, case or tag spelling.'''
+    canonical = {key: value.lower() if isinstance(value, str) else value for key, value in args.items()}
+    if name == "get_mutual_funds_set":
+        canonical["tags"] = sorted(set(tag_index.normalise_tag(tag) for tag in args.get("tags", [])))
+        canonical["match"] = canonical.get("match", "any")
+        canonical["top_k"] = int(canonical.get("top_k", TOP_K_FUNDS))
+    return name + json.dumps(canonical, sort_keys=True, default=str)
+
+def _timed_call(started, name, args):
+    started["at"] = time.monotonic()
+    started["event"].set()
+    return call_tool(name, args)
+
+def run_tool_calls(function_calls, memo=None):
+    '''
+    Run the function calls of one model turn concurrently.
+
+    Args:
+        function_calls: List of FunctionCall in the order the model sent them
+        memo: Optional dictionary of tool_key to result, matching calls are answered from it
+
+    Each timeout counts from when the call starts running, so time spent waiting for a worker
+    behind other requests is bounded separately by TOOL_QUEUE_TIMEOUT.
+
+    Returns:
+        List of (name, args, result) in the same order, a call over its timeout gets an error result
+    '''
+    submitted = time.monotonic()
+    pending = []
+    for function_call in function_calls:
+        name = function_call.name
+        args = dict(function_call.args or {})  # Convert to dict
+        key = tool_key(name, args)
+        if memo is not None and key in memo:
+            logger.debug(f"Answering tool: {name} with args: {args} from speculative result")
+            pending.append((name, args, memo[key]))
+            continue
+        logger.debug(f"Calling tool: {name} with args: {args}")
+        started = {"event": threading.Event(), "at": None}
+        pending.append((name, args, (tool_executor.submit(_timed_call, started, name, args), started)))
+
+    results = []
+    for name, args, call in pending:
+        if not isinstance(call, tuple):
+            results.append((name, args, call))
+            continue
+        future, started = call
+        timeout = TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT)
+        if not started["event"].wait(timeout=max(0.0, submitted + TOOL_QUEUE_TIMEOUT - time.monotonic())) and future.cancel():
+            logger.error(f"Tool {name} did not get a worker within {TOOL_QUEUE_TIMEOUT}s")
+            results.append((name, args, {"error": f"{name} could not be run, the tool workers are busy"}))
+            continue
+        started["event"].wait()
+        try:
+            result = future.result(timeout=max(0.0, started["at"] + timeout - time.monotonic()))
+        except FutureTimeoutError:
+            logger.error(f"Tool {name} timed out after {timeout}s")
+            result = {"error": f"{name} timed out"}
+        results.append((name, args, result))
+    return results
+
 def datesort(memory):
-    print(f"Memory: {memory}")
     created = parse(memory.get("created_at"))
-    if getattr(memory, "updated_at", None):
+    if memory.get("updated_at"):
         updated = parse(memory.get("updated_at"))
         created = max(created, updated)
     return created
 
+ADVICE_INDEX_PATH = os.getenv("ADVICE_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "advice_index.db"))
+latest_advice = advice_index.AdviceIndex(ADVICE_INDEX_PATH, history_size=int(os.getenv("ADVICE_HISTORY_SIZE","10")))
+
 
 def memory(task,userid,messages=None):
     try:
-        gemini_api_key = os.getenv("GOOGLE_API_KEY")
-        llm_config_data = {
-            'api_key': gemini_api_key,
-            'model': 'gemini-2.5-flash'
-        }
-
-        embed_config_data = {
-            'api_key': gemini_api_key,
-            'model': 'models/text-embedding-004'
-        }
-
-        qdrant_specific_config_data = {
-            "collection_name": "Dravina",
-            "url": os.getenv('QDRANT_URL'),
-            "api_key": os.getenv('QDRANT_API_KEY'),
-            "on_disk": True,
-            "embedding_model_dims":768,
-        }
-
-        configs = MemoryConfig(
-            llm=LlmConfig(
-                provider='gemini',
-                config=llm_config_data
-            ),
-            embedder=EmbedderConfig(
-                provider='gemini',
-                config=embed_config_data
-            ),
-            vector_store=VectorStoreConfig(
-                provider='qdrant',
-                config=qdrant_specific_config_data
-            )
-        )
-        client = Memory(config=configs)
-
         if task == "get_memory":
+            client = memory_service.service.client()
             retval = []
             res = client.get_all(user_id=str(userid),limit=10)
             res = res.get("results",[])
@@ -370,25 +421,42 @@ def memory(task,userid,messages=None):
             print(f"Retval: {retval}")
             return retval
         elif task == "add_memory":
-            tosend = part_to_memory(messages)
-            client.add(messages=tosend[0], user_id=str(userid))
-            client.add(messages=tosend[1], user_id=str(userid),infer=False,metadata={"type":"finance_advice"})
+            # Written behind by the queue worker so the advice is returned without waiting on it
+            advice_writes.put(userid, memory_messages(messages))
         elif task == "get_last_advice":
+            advice = latest_advice.latest(userid)
+            if advice is not None:
+                return advice
+            # Users not indexed yet, search once and backfill the index, with an empty negative
+            # entry when there is no advice so the search does not repeat
+            client = memory_service.service.client()
             res = client.search(query="",filters={"type":"finance_advice"},user_id=str(userid),limit=100)
             res = res.get("results",[])
             if len(res) > 0:
                 maxmem = max(res,key=datesort)
-                return maxmem.memory
+                latest_advice.record(userid, maxmem["memory"], datesort(maxmem).timestamp())
+                return maxmem["memory"]
             else:
+                latest_advice.record(userid, "")
                 return ""
         return {}
     except Exception as e:
         logger.error(f"Error in memory: {e}")
+        memory_service.service.mark_failed()
         return {}
 
-def part_to_memory(messages):
-    tosend = [[],[]]
-    for content in messages:
+def memory_messages(contents):
+    '''
+    Plain text messages of a conversation worth remembering, in a form that can be queued.
+
+    Args:
+        contents: List of types.Content from the advice loop
+
+    Returns:
+        List of dictionaries with role and content
+    '''
+    messages = []
+    for content in contents:
         parts = content.parts
         if content.role == "model":
             part = content.parts[0]
@@ -397,17 +465,50 @@ def part_to_memory(messages):
         if parts:
             for part in parts:
                 if part.text:
-                    vals = {}
-                    vals['content'] = part.text
-                    vals['role'] = content.role
-                    if part.text.startswith("Result -"):
-                        result = key_finance_advice(part.text)
-                        vals['content'] = result
-                        tosend[1].append(vals)
-                    else:
-                        tosend[0].append(vals)
+                    messages.append({'role': content.role, 'content': part.text})
+    return messages
+
+def part_to_memory(messages):
+    '''Split messages into the conversation and the "Result -" advice.'''
+    tosend = [[],[]]
+    for message in messages:
+        vals = dict(message)
+        if vals['content'].startswith("Result -"):
+            tosend[1].append(vals)
+        else:
+            tosend[0].append(vals)
     return tosend
 
+def write_memory(userid,messages,state,checkpoint):
+    '''
+    Extract the structured advice and store the memories, raising on failure so the queue retries.
+
+    Each step records its result in state and checkpoints it, so a retry resumes after the steps
+    that already succeeded instead of extracting the advice or adding memories again.
+    '''
+    tosend = part_to_memory(messages)
+    if "advice" not in state:
+        state["advice"] = [dict(vals, content=key_finance_advice(vals['content'])) for vals in tosend[1]]
+        checkpoint()
+    if not state.get("conversation_added"):
+        memory_service.service.client().add(messages=tosend[0], user_id=str(userid))
+        state["conversation_added"] = True
+        checkpoint()
+    if not state.get("advice_added"):
+        memory_service.service.client().add(messages=state["advice"], user_id=str(userid),infer=False,metadata={"type":"finance_advice"})
+        state["advice_added"] = True
+        checkpoint()
+    if not state.get("indexed"):
+        for advice in state["advice"]:
+            if advice['content']:
+                latest_advice.record(userid, advice['content'])
+        state["indexed"] = True
+        checkpoint()
+
+ADVICE_QUEUE_PATH = os.getenv("ADVICE_QUEUE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "advice_queue.db"))
+advice_writes = advice_queue.WriteBehindQueue(ADVICE_QUEUE_PATH, write_memory)
+advice_writes.start()
+
 def compare_advice(advice,prevadvice):
     system_prompt = '''
     You are a financial recommendation comparison assistant. Your task is to compare two pieces of financial advice and highlight the key differences.
@@ -431,13 +532,7 @@ def compare_advice(advice,prevadvice):
             - Explain in simple language why the recommendation changed
     '''
     try:
-        client = genai.Client()
-        config = types.GenerateContentConfig(
-            thinking_config=types.ThinkingConfig(
-                thinking_budget=-1  # Dynamic thinking
-            ),
-            response_mime_type="application/json",
-        )
+        config = llm_client.json_config()
         
         contents = [
             types.Content(
@@ -451,11 +546,7 @@ def compare_advice(advice,prevadvice):
             )
         ]
         
-        response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=contents,
-        config=config
-        )
+        response = llm_client.generate(contents, config)
         candidate = response.candidates[0]
         if candidate and candidate.content and candidate.content.parts:
             parts = candidate.content.parts[0]
@@ -466,8 +557,196 @@ def compare_advice(advice,prevadvice):
         logger.error(f"Error in compare_advice: {e}")
         return ""
 
+PREFETCH_TIMEOUT = float(os.getenv("PREFETCH_TIMEOUT","30"))
+PROFILE_TIMEOUT = float(os.getenv("PROFILE_TIMEOUT","60"))
+DEFAULT_PROFILE = Userbehav(risk_tolerance="ready for anything", time_horizon="ready for anything")
+
+def prefetch_context(query,userid):
+    '''
+    Run everything needed before the first advice turn concurrently.
+
+    Profile analysis, memory retrieval, the last advice lookup and the fund snapshot warm up are
+    independent, so the wait is bounded by the slowest of them. Each request gets its own pool with
+    a thread per task, so no task waits behind other requests and every timeout covers only the
+    task's own run. A task that fails or exceeds its timeout is cancelled and falls back to a
+    neutral default instead of failing the request.
+
+    Returns:
+        Dictionary with profile, memory, last_advice, funds_ready and query_embedding
+    '''
+    calls = {
+        "profile": ((analyze_user_profile, query), PROFILE_TIMEOUT, DEFAULT_PROFILE),
+        "memory": ((memory, "get_memory", userid), PREFETCH_TIMEOUT, []),
+        "last_advice": ((memory, "get_last_advice", userid), PREFETCH_TIMEOUT, ""),
+        "funds_ready": ((getkb.warm_up,), PREFETCH_TIMEOUT, False),
+        "query_embedding": ((llm_client.embed, query), PREFETCH_TIMEOUT, None),
+    }
+    executor = ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="prefetch")
+    started = time.monotonic()
+    tasks = {name: (executor.submit(*call), timeout, default) for name, (call, timeout, default) in calls.items()}
+    context = {}
+    try:
+        for name, (future, timeout, default) in tasks.items():
+            try:
+                value = future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+                context[name] = True if name == "funds_ready" else value
+            except Exception as e:
+                future.cancel()
+                logger.error(f"Prefetch of {name} failed, using default: {e!r}")
+                context[name] = default
+    finally:
+        # Tasks still running after their timeout finish in the background without blocking the request
+        executor.shutdown(wait=False, cancel_futures=True)
+    # memory() reports errors as an empty dict
+    if not isinstance(context["memory"], list):
+        context["memory"] = []
+    if not isinstance(context["last_advice"], str):
+        context["last_advice"] = ""
+    if context["profile"] is None:
+        context["profile"] = DEFAULT_PROFILE
+    return context
+
+SPECULATIVE_TOOLS = os.getenv("SPECULATIVE_TOOLS","1").lower() in ("1","true","yes")
+PROFILE_TO_RISK = {
+    "conservative": "low risk",
+    "moderate": "medium risk",
+    "aggressive": "high risk",
+}
+PROFILE_TO_TIME = {
+    "short term": "short term",
+    "medium term": "medium term",
+    "long term": "long term",
+}
+
+def fund_types_as_tags(fund_types):
+    if isinstance(fund_types, dict):
+        return [tag for value in fund_types.values() for tag in fund_types_as_tags(value)]
+    if isinstance(fund_types, list):
+        return [tag for tag in fund_types if isinstance(tag, str)]
+    return []
+
+def speculative_tool_calls(user_profile):
+    '''
+    Run details_to_types and get_mutual_funds_set for the analysed profile before the first model turn.
+
+    Returns:
+        List of (name, args, result) in the order the workflow calls them
+    '''
+    risk = PROFILE_TO_RISK.get(user_profile.risk_tolerance.strip().lower(), "all risk")
+    time_horizon = PROFILE_TO_TIME.get(user_profile.time_horizon.strip().lower(), "all term")
+    calls = []
+    args = {"risk": risk, "time": time_horizon}
+    fund_types = call_tool("details_to_types", args)
+    calls.append(("details_to_types", args, fund_types))
+    tags = fund_types_as_tags(fund_types)
+    if tags:
+        args = {"tags": tags}
+        calls.append(("get_mutual_funds_set", args, call_tool("get_mutual_funds_set", args)))
+    return calls
+
+def append_tool_exchange(contents, name, args, result, call_id):
+    # Only the projected, budgeted result is re-sent on every later iteration
+    result, _ = tool_results.shape(name, result)
+    contents.append(types.Content(
+        role="user",
+        parts=[types.Part(function_call=FunctionCall(name=name,args=args,id=call_id))]
+    ))
+    dict_response = {
+        "output": result
+    }
+    contents.append(types.Content(
+        role="user",
+        parts=[types.Part(function_response=FunctionResponse(response=dict_response,will_continue=False,name=name,id=call_id))]
+    ))
+
+ADVICE_CACHE = os.getenv("ADVICE_CACHE","1").lower() in ("1","true","yes")
+advice_responses = advice_cache.AdviceCache(
+    capacity=int(os.getenv("ADVICE_CACHE_SIZE","256")),
+    ttl=float(os.getenv("ADVICE_CACHE_TTL","3600")),
+    threshold=float(os.getenv("ADVICE_CACHE_THRESHOLD","0.95"))
+)
+
+def profile_key(user_profile):
+    return f"{user_profile.risk_tolerance.strip().lower()}|{user_profile.time_horizon.strip().lower()}"
+
+def personalise_advice(query,user_profile,memory_list,tool_calls):
+    '''
+    Write the advice for this user from cached tool results in one light LLM call.
+
+    Args:
+        query: The user's query
+        user_profile: Analysed Userbehav of the query
+        memory_list: Memories of the user
+        tool_calls: Cached list of (name, args, result) of a similar query with the same profile
+
+    Returns:
+        Advice starting with "Result -", empty string if the model did not produce one
+    '''
+    system_prompt = f'''
+    You are a professional financial advisor. The tool results below were gathered for a user with
+    Risk Tolerance: {user_profile.risk_tolerance} and Time Horizon: {user_profile.time_horizon}.
+
+    # Guidelines
+    - ONLY use funds present in the tool results, they are ranked best first
+    - SELECT 2-4 specific funds and ALLOCATE percentages of the user's own monthly savings to each
+    - ALWAYS compute amounts, portfolio allocation and review timeline from this user's query, age, income and expenses
+    - JUSTIFY each selection with reasoning based on the user's situation
+    - Include the tax information for equity and debt funds
+    - Start the answer with "Result - " in markdown format
+    '''
+    try:
+        contents = [
+            types.Content(role="model", parts=[types.Part(text=system_prompt)]),
+            types.Content(role="user", parts=[types.Part(text=f"{query}")])
+        ]
+        for i in memory_list:
+            contents.append(types.Content(role="user", parts=[types.Part(text=i['memory'])]))
+        for index, (name, args, result) in enumerate(tool_calls):
+            append_tool_exchange(contents, name, args, result, f"cached-{index}")
+        response = llm_client.generate(contents, llm_client.text_config())
+        text = response.text or ""
+        return text if text.startswith("Result -") else ""
+    except Exception as e:
+        logger.error(f"Error in personalise_advice: {e}")
+        return ""
+
+def finish_advice(advice,prev_advice,userid,contents):
+    '''Compare the advice with the previous one, queue it for memory and return the final answer.'''
+    finalans = advice
+    if len(prev_advice) > 0:
+        finalans = compare_advice(advice,prev_advice)
+    contents.append(types.Content(
+        role="user",
+        parts=[types.Part(text=finalans)]
+    ))
+    memory("add_memory",userid,contents)
+    return finalans
+
+advice_config = llm_client.tools_config([
+    get_mutual_funds_set_declaration,
+    get_info_about_fund_declaration,
+    details_to_types_declaration
+])
+
 def get_finance_advice(query,userid):
-    user_profile = analyze_user_profile(query)
+    context = prefetch_context(query,userid)
+    user_profile = context["profile"]
+
+    # Near-duplicate queries with the same profile and fund data reuse the cached tool results,
+    # the advice itself is always written for this user's query
+    cache_key = None
+    if ADVICE_CACHE and context["query_embedding"] is not None:
+        try:
+            cache_key = (profile_key(user_profile), context["query_embedding"], getkb.funds_version())
+            cached = advice_responses.lookup(*cache_key)
+            if cached:
+                advice = personalise_advice(query,user_profile,context["memory"],cached)
+                if advice:
+                    contents = [types.Content(role="user", parts=[types.Part(text=f"{query}")])]
+                    return finish_advice(advice,context["last_advice"],userid,contents)
+        except Exception as e:
+            logger.error(f"Error in advice cache: {e}")
+            cache_key = None
     
     system_prompt = f'''
     You are a professional financial advisor who provides personalized investment insights using reasoning and available tools.
@@ -490,15 +769,13 @@ def get_finance_advice(query,userid):
     2. **STEP 2 - Get Fund Types**: Call `details_to_types` based on user's risk appetite and investment timeline
     
     3. **STEP 3 - Get Specific Funds (MANDATORY)**: Call `get_mutual_funds_set` with fund types as tags
-       - CRITICAL: Remove the word "fund" from tags when calling this tool
-       - Example: "Large Cap Funds" → use tag "large cap"
-       - Example: "Multi Cap Funds" → use tag "multi cap"  
-       - Example: "Equity Funds" → use tag "equity"
-       - Example: "Debt Funds" → use tag "debt"
+       - Pass the fund types exactly as returned by `details_to_types`, tags are normalised by the tool
+       - Example: "Large Cap Funds" and "large cap" return the same funds
     
     4. **STEP 4 - Make Strategic Recommendations**: 
        - **DO NOT list all available funds**
        - **SELECT 2-4 specific funds maximum** based on user's profile
+       - Funds from `get_mutual_funds_set` are already ranked best first using the prioritization below, with a 'score'
        - **ALLOCATE percentage of monthly savings** to each selected fund
        - **JUSTIFY each selection** with reasoning based on user's situation
        - Use the following prioritization for each mutual fund:
@@ -514,9 +791,11 @@ def get_finance_advice(query,userid):
     
     5. **STEP 5 - Optional Details**: Call `get_info_about_fund` using the category and fund type for additional context if needed
 
+    If results of `details_to_types` and `get_mutual_funds_set` are already in the conversation and match the user's
+    profile, use them instead of calling the tools again.
+
     # CRITICAL ADVISORY RULES
     - **NEVER provide final results without calling get_mutual_funds_set**
-    - **ALWAYS convert fund types to proper tags by removing "fund" and "funds"**
     - **SELECT specific funds, don't list all options**
     - **ALLOCATE percentages based on user's risk profile and timeline**
     - **JUSTIFY selections with personalized reasoning**
@@ -581,20 +860,9 @@ def get_finance_advice(query,userid):
     '''
 
     try:
-        client = genai.Client()
-        tools = types.Tool(function_declarations=[
-            get_mutual_funds_set_declaration,
-            get_info_about_fund_declaration,
-            details_to_types_declaration
-        ])
-        config = types.GenerateContentConfig(
-            tools=[tools],
-            thinking_config=types.ThinkingConfig(
-                thinking_budget=-1  # Dynamic thinking
-            )
-        )
+        config = advice_config
         
-        memory_list = memory("get_memory",userid)
+        memory_list = context["memory"]
         logger.info(f"Memory list: {memory_list}")
         contents = [
             types.Content(
@@ -611,16 +879,21 @@ def get_finance_advice(query,userid):
                     role="user", parts=[types.Part(text=i['memory'])]
                 ))
         
+        # Pre-satisfy the mandatory details_to_types and get_mutual_funds_set steps from the profile
+        tool_memo = {}
+        tool_log = []
+        if SPECULATIVE_TOOLS:
+            for index, (name, args, result) in enumerate(speculative_tool_calls(user_profile)):
+                tool_memo[tool_key(name, args)] = result
+                tool_log.append((name, args, result))
+                append_tool_exchange(contents, name, args, result, f"speculative-{index}")
+
         loop = 1
         max_loops = 10
         
         while loop < max_loops:
             try:
-                response = client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=contents,
-                    config=config
-                )
+                response = llm_client.generate(contents, config)
 
                 print(f"Response: {response}")
                 candidate = response.candidates[0]
@@ -630,34 +903,21 @@ def get_finance_advice(query,userid):
                 # Check if we have a final result
                 for part in parts:
                     if part.text and part.text.startswith("Result -"):
-                        finalans = part.text
-                        prev_advice = memory("get_last_advice",userid)
-                        if len(prev_advice) > 0:
-                            finalans = compare_advice(part.text,prev_advice)
-                        contents.append(types.Content(
-                            role="user",
-                            parts=[types.Part(text=finalans)]
-                        ))
-                        memory("add_memory",userid,contents)
-                        return finalans
-                    
+                        # Each distinct tool call once, timed out or failed calls are not cached
+                        cacheable = list({tool_key(name, args): (name, args, result) for name, args, result in tool_log
+                                          if not (isinstance(result, dict) and "error" in result)}.values())
+                        if cache_key and cacheable:
+                            advice_responses.store(cache_key[0], cache_key[1], cacheable, cache_key[2])
+                        return finish_advice(part.text,context["last_advice"],userid,contents)
+
+                # Every tool requested in this turn runs concurrently, results are appended in part order
+                tool_calls = run_tool_calls([part.function_call for part in parts if part.function_call], tool_memo)
+                for part in parts:
                     if part.function_call:
-                        name = part.function_call.name
-                        args = dict(part.function_call.args)  # Convert to dict
-                        print(f"Calling tool: {name} with args: {args}")
-                        result = call_tool(name, args)
+                        name, args, result = tool_calls.pop(0)
+                        tool_log.append((name, args, result))
                         print(f"Tool result obtained",len(result))
-                        contents.append(types.Content(
-                            role="user",
-                            parts=[types.Part(function_call=FunctionCall(name=name,args=args,id=part.function_call.id))]
-                        ))
-                        dict_response = {
-                            "output": result
-                        }
-                        contents.append(types.Content(
-                            role="user",
-                            parts=[types.Part(function_response=FunctionResponse(response=dict_response,will_continue=False,name=name,id=part.function_call.id))]
-                        ))
+                        append_tool_exchange(contents, name, args, result, part.function_call.id)
                     else:
                         contents.append(types.Content(role="model", parts=[part]))
                         print(contents[-1])
@@ -0,0 +1,95 @@
+import json
+import zlib
+
+#Kept identical in Backend/scraping/compact_format.py, which writes the datasets,
+#and Backend/Agent/compact_format.py, which reads them, because the two services are deployed separately
+#Compact storage format for the scraped datasets
+#Layout -> MAGIC, one JSON header line, then one zlib compressed JSON segment per column or top level key
+#A list of records is stored column wise so keys like "decrease from last time" are written once,
+#any other dictionary is stored key wise, and each segment can be decoded on its own
+MAGIC = b"DRVC1\n"
+MEDIA_TYPE = "application/x-dravina-compact"
+SUFFIX = ".drvc"
+
+
+def _is_records(data):
+    return isinstance(data, list) and len(data) > 0 and all(isinstance(row, dict) for row in data)
+
+#Function to encode a dataset into the compact format
+#Input -> Scraped dataset (list of records or dictionary)
+#Output -> Bytes of the encoded dataset
+def encode(data, level:int = 9):
+    if _is_records(data):
+        layout = "columns"
+        names = []
+        for row in data:
+            for key in row:
+                if key not in names:
+                    names.append(key)
+        values = {name: [row.get(name) for row in data] for name in names}
+        rows = len(data)
+    elif isinstance(data, dict):
+        layout = "keys"
+        names = list(data.keys())
+        values = data
+        rows = len(data)
+    else:
+        layout = "value"
+        names = [""]
+        values = {"": data}
+        rows = 1
+
+    segments = []
+    body = b""
+    for name in names:
+        payload = zlib.compress(json.dumps(values[name], separators=(",",":"), ensure_ascii=False).encode('utf-8'), level)
+        segments.append({"name": name, "offset": len(body), "length": len(payload)})
+        body += payload
+    header = json.dumps({"layout": layout, "rows": rows, "segments": segments}, separators=(",",":")).encode('utf-8')
+    return MAGIC + header + b"\n" + body
+
+
+#Reader which only decompresses the columns or keys that are asked for
+class CompactReader:
+    def __init__(self, blob:bytes):
+        if not blob.startswith(MAGIC):
+            raise ValueError("Not a compact dataset")
+        end = blob.index(b"\n", len(MAGIC))
+        header = json.loads(blob[len(MAGIC):end])
+        self.layout = header["layout"]
+        self.rows = header["rows"]
+        self._segments = {segment["name"]: segment for segment in header["segments"]}
+        self._names = [segment["name"] for segment in header["segments"]]
+        self._body = memoryview(blob)[end+1:]
+        self._decoded = {}
+
+    def names(self):
+        return list(self._names)
+
+    #Decode a single column (or top level key)
+    def segment(self, name:str):
+        if name not in self._decoded:
+            segment = self._segments[name]
+            payload = self._body[segment["offset"]:segment["offset"]+segment["length"]]
+            self._decoded[name] = json.loads(zlib.decompress(payload))
+        return self._decoded[name]
+
+    #Rebuild the records using only the given columns
+    #Columns pad records without a key with null, so null values are left out to give back the scraped records
+    def records(self, columns=None):
+        if self.layout != "columns":
+            raise ValueError("Dataset is not stored column wise")
+        columns = [name for name in (columns or self._names) if name in self._segments]
+        values = [self.segment(name) for name in columns]
+        return [{name: value for name, value in zip(columns, row) if value is not None} for row in zip(*values)]
+
+    def to_python(self):
+        if self.layout == "columns":
+            return self.records()
+        if self.layout == "keys":
+            return {name: self.segment(name) for name in self._names}
+        return self.segment("")
+
+
+def decode(blob:bytes):
+    return CompactReader(blob).to_python()
@@ -1,49 +1,83 @@
 import sys
 import os
-import requests
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from typing import List
 from dotenv import load_dotenv
+import tag_index
+import kb_client
+import ranking
 
 load_dotenv()
 
+kb = kb_client.KBClient(
+    os.getenv('PATH_TO_SCRAPER',""),
+    ttl=float(os.getenv('KB_SNAPSHOT_TTL',"300")),
+    timeout=float(os.getenv('KB_TIMEOUT',"30")),
+    snapshot_dir=os.getenv('KB_SNAPSHOT_DIR',""),
+    compact=os.getenv('KB_COMPACT',"1").lower() in ("1","true","yes")
+)
+
+# Get a dataset from the shared snapshot cache
+def fetch_details(info: str):
+    return kb.get(info)
+
+# Only these columns are decoded to build the tag index and the ranker
+INDEX_COLUMNS = ["tags", "return_pct", "return", "expense_ratio_pct", "expense ratio", "aum_cr", "aum", "decrease from last time"]
+_fund_indexes = None
+
+# Tag index and ranker for a snapshot of the fund list, rebuilt only when a new version is downloaded
+# A compact snapshot only decodes INDEX_COLUMNS here, the full records are decoded once results are needed
+def fund_indexes(snapshot):
+    global _fund_indexes
+    if _fund_indexes is None or _fund_indexes[0] is not snapshot:
+        funds = snapshot.columns(INDEX_COLUMNS)
+        _fund_indexes = (snapshot, tag_index.TagIndex(funds), ranking.FundRanker(funds))
+    return _fund_indexes[1], _fund_indexes[2]
+
 # Get details about every mutual fund
-def obtain_mutual_funds(tags: List[str]):
+# match is "any" for funds with at least one of the tags and "all" for funds with every tag
+def obtain_mutual_funds(tags: List[str], match: str = "any"):
     try:
-        setsearch = set(tags)
-        retval = []
-        path = os.getenv('PATH_TO_SCRAPER',"")
-        url = path + "/get_details/mutual_funds"
-        response = requests.get(url)
-        fund_list = response.json()[0]['data']
+        snapshot = kb.snapshot("mutual_funds")
         # Add validation for fund_list
-        if not fund_list:
+        if not snapshot.data:
             print("No mutual funds data available")
             return []
-        
-        for i in fund_list:
-            # Add validation for fund structure
-            if not isinstance(i, dict) or 'tags' not in i:
-                print(f"Invalid fund structure: {i}")
-                continue
-                
-            for j in i['tags']:
-                if j in setsearch:
-                    retval.append(i)
-                    break
-        return retval
+        fund_tags, _ = fund_indexes(snapshot)
+        return [snapshot.data[position] for position in fund_tags.positions(tags, match)]
     except Exception as e:
         print(f"Error in obtain_mutual_funds: {e}")
         return []
 
+# Get the best k funds matching the tags, ranked by return, expense ratio and AUM
+# Each fund is returned with its ranking score
+def obtain_top_funds(tags: List[str], match: str = "any", k: int = 10):
+    try:
+        snapshot = kb.snapshot("mutual_funds")
+        fund_tags, ranker = fund_indexes(snapshot)
+        if not ranker.funds:
+            print("No mutual funds data available")
+            return []
+        ranked = ranker.rank(fund_tags.positions(tags, match), k)
+        return [dict(snapshot.data[position], score=score) for position, score in ranked]
+    except Exception as e:
+        print(f"Error in obtain_top_funds: {e}")
+        return []
+
+# Version of the fund list the agent is currently answering from
+def funds_version():
+    return kb.version("mutual_funds")
+
+# Load the snapshots and build the fund index and ranker ahead of the first tool call
+def warm_up():
+    fund_indexes(kb.snapshot("mutual_funds"))
+    fetch_details("mutual_funds_details")
+
 # Get information on stones
 def obtain_stone_vals(option: str):  # Changed from int to str to match usage
     print("getting stone")
     try:
-        path = os.getenv('PATH_TO_SCRAPER',"")
-        url = path + "/get_details/precious_stone_details"
-        response = requests.get(url)
-        list_val = response.json()['data']
+        list_val = fetch_details("precious_stone_details")
         
         if not list_val:
             print("No stone data available")
@@ -62,10 +96,7 @@ def obtain_stone_vals(option: str):  # Changed from int to str to match usage
 def obtain_fund_type_info(category: str, fund: str):
     print("Getting Fund types")
     try:
-        path = os.getenv('PATH_TO_SCRAPER',"")
-        url = path + "/get_details/mutual_funds_details"
-        response = requests.get(url)
-        details = response.json()['data']
+        details = fetch_details("mutual_funds_details")
         
         if not details:
             print("No fund details available")
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+import compact_format
+
+logger = logging.getLogger(__name__)
+
+DATASETS = ["mutual_funds", "mutual_funds_details", "precious_stone_details"]
+
+
+class Snapshot:
+    '''
+    One version of a dataset.
+
+    A snapshot received in the compact format keeps its reader and is only decoded in full on the
+    first access to data. columns() reads just the requested columns of a record dataset.
+    '''
+    def __init__(self, info: str, etag: str, data=None, fetched_at: float = 0.0, reader=None, blob: bytes = None):
+        self.info = info
+        self.etag = etag
+        self.fetched_at = fetched_at
+        self.reader = reader
+        self.blob = blob
+        self._data = data
+        self._lock = threading.Lock()
+
+    @property
+    def data(self):
+        if self._data is None and self.reader is not None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self.reader.to_python()
+        return self._data
+
+    def columns(self, names):
+        '''Records of a record dataset with only the given keys.'''
+        if self._data is None and self.reader is not None and self.reader.layout == "columns":
+            return self.reader.records(names)
+        return [{name: row[name] for name in names if name in row} for row in self.data]
+
+
+class KBClient:
+    '''
+    Client for the scraper's datasets shared by every getkb lookup.
+
+    Keeps one pooled HTTP session and a versioned snapshot of each dataset in memory,
+    optionally persisted to disk for warm restarts. Snapshots older than the TTL are
+    still served while a background conditional request refreshes them.
+
+    With compact set the compact columnar format is requested, the scraper answers with JSON
+    for datasets that were not written in it, so both are accepted.
+    '''
+    def __init__(self, base_url: str, ttl: float = 300, timeout: float = 30, snapshot_dir: str = "", compact: bool = True):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.snapshot_dir = snapshot_dir
+        self.compact = compact
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=16))
+        self.session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=16))
+        self._snapshots = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _disk_path(self, info: str):
+        return os.path.join(self.snapshot_dir, f"{info}.json")
+
+    def _load_disk(self, info: str):
+        if not self.snapshot_dir:
+            return None
+        try:
+            with open(self._disk_path(info), encoding='utf-8') as f:
+                stored = json.load(f)
+            # Loaded snapshots count as stale so they are revalidated on first use
+            if stored.get("format") == "compact":
+                with open(self._disk_path(info) + compact_format.SUFFIX, 'rb') as f:
+                    blob = f.read()
+                return Snapshot(info, stored.get("etag", ""), reader=compact_format.CompactReader(blob), blob=blob)
+            return Snapshot(info, stored.get("etag", ""), stored["data"], 0.0)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading snapshot {info}: {e}")
+            return None
+
+    def _save_disk(self, snapshot: Snapshot):
+        if not self.snapshot_dir:
+            return
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            path = self._disk_path(snapshot.info)
+            if snapshot.blob is not None:
+                # The compact blob is stored as received, so saving never decodes it
+                with open(path + compact_format.SUFFIX + ".tmp", 'wb') as f:
+                    f.write(snapshot.blob)
+                os.replace(path + compact_format.SUFFIX + ".tmp", path + compact_format.SUFFIX)
+                stored = {"etag": snapshot.etag, "format": "compact"}
+            else:
+                stored = {"etag": snapshot.etag, "data": snapshot.data}
+            with open(path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(stored, f)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            logger.error(f"Error writing snapshot {snapshot.info}: {e}")
+
+    def refresh(self, info: str):
+        '''
+        Fetch a dataset with a conditional request and store the new snapshot.
+
+        Returns:
+            The current snapshot, unchanged data is reused when the server answers 304
+        '''
+        with self._lock:
+            cached = self._snapshots.get(info)
+        headers = {}
+        if self.compact:
+            headers["Accept"] = f"{compact_format.MEDIA_TYPE}, application/json"
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        response = self.session.get(f"{self.base_url}/get_details/{info}", headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            cached.fetched_at = time.monotonic()
+            return cached
+        response.raise_for_status()
+        etag = response.headers.get("ETag", "")
+        if response.headers.get("Content-Type", "").startswith(compact_format.MEDIA_TYPE):
+            blob = response.content
+            snapshot = Snapshot(info, etag, fetched_at=time.monotonic(), reader=compact_format.CompactReader(blob), blob=blob)
+        else:
+            snapshot = Snapshot(info, etag, response.json()['data'], time.monotonic())
+        with self._lock:
+            self._snapshots[info] = snapshot
+        self._save_disk(snapshot)
+        return snapshot
+
+    def _refresh_background(self, info: str):
+        try:
+            self.refresh(info)
+        except Exception as e:
+            logger.error(f"Error refreshing {info}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(info)
+
+    def _schedule_refresh(self, info: str):
+        with self._lock:
+            if info in self._refreshing:
+                return
+            self._refreshing.add(info)
+        threading.Thread(target=self._refresh_background, args=(info,), daemon=True).start()
+
+    def snapshot(self, info: str):
+        with self._lock:
+            snapshot = self._snapshots.get(info)
+        if snapshot is None:
+            snapshot = self._load_disk(info)
+            if snapshot is not None:
+                with self._lock:
+                    snapshot = self._snapshots.setdefault(info, snapshot)
+        if snapshot is None:
+            return self.refresh(info)
+        if time.monotonic() - snapshot.fetched_at > self.ttl:
+            self._schedule_refresh(info)
+        return snapshot
+
+    def get(self, info: str):
+        return self.snapshot(info).data
+
+    def columns(self, info: str, names):
+        '''Records of a dataset with only the given keys, decoding just those columns when possible.'''
+        return self.snapshot(info).columns(names)
+
+    def version(self, info: str):
+        return self.snapshot(info).etag
+
+    def warm_up(self, infos=None):
+        '''Refresh the given datasets (all by default) in the background.'''
+        for info in infos or DATASETS:
+            self._schedule_refresh(info)
@@ -0,0 +1,87 @@
+import os
+import threading
+from functools import lru_cache
+import httpx
+from google import genai
+from google.genai import types
+
+MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+EMBED_MODEL = os.getenv("GEMINI_EMBED_MODEL", "text-embedding-004")
+LLM_TIMEOUT_MS = int(os.getenv("LLM_TIMEOUT_MS", "120000"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    '''
+    Process-wide Gemini client.
+
+    Every LLM call in the agent goes through this client so its HTTP connection pool, sized by
+    LLM_MAX_CONNECTIONS, is reused across calls and requests.
+    '''
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = genai.Client(http_options=types.HttpOptions(
+                timeout=LLM_TIMEOUT_MS,
+                client_args={"limits": httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS
+                )}
+            ))
+        return _client
+
+def set_client(client):
+    '''Replace the shared client, e.g. with a fake one for offline benchmarks. None restores the default.'''
+    global _client
+    with _client_lock:
+        _client = client
+
+def _http_options(timeout_ms):
+    return types.HttpOptions(timeout=timeout_ms) if timeout_ms else None
+
+@lru_cache(maxsize=None)
+def json_config(schema=None, timeout_ms: int = None):
+    '''Shared config for JSON answers with dynamic thinking, optionally parsed into a schema.'''
+    return types.GenerateContentConfig(
+        thinking_config=types.ThinkingConfig(
+            thinking_budget=-1  # Dynamic thinking
+        ),
+        response_mime_type="application/json",
+        response_schema=schema,
+        http_options=_http_options(timeout_ms)
+    )
+
+@lru_cache(maxsize=None)
+def text_config(thinking_budget: int = 0, timeout_ms: int = None):
+    '''Config for a plain text answer, without thinking by default for cheap rewriting passes.'''
+    return types.GenerateContentConfig(
+        thinking_config=types.ThinkingConfig(
+            thinking_budget=thinking_budget
+        ),
+        http_options=_http_options(timeout_ms)
+    )
+
+def tools_config(declarations, timeout_ms: int = None):
+    '''Config for a tool calling turn with dynamic thinking.'''
+    return types.GenerateContentConfig(
+        tools=[types.Tool(function_declarations=declarations)],
+        thinking_config=types.ThinkingConfig(
+            thinking_budget=-1  # Dynamic thinking
+        ),
+        http_options=_http_options(timeout_ms)
+    )
+
+def generate(contents, config, model: str = MODEL):
+    return get_client().models.generate_content(
+        model=model,
+        contents=contents,
+        config=config
+    )
+
+def embed(text: str, model: str = EMBED_MODEL):
+    '''Embedding vector of a text.'''
+    response = get_client().models.embed_content(model=model, contents=text)
+    return response.embeddings[0].values
@@ -0,0 +1,111 @@
+import os
+import time
+import threading
+import logging
+from mem0 import Memory
+from mem0.configs.base import MemoryConfig, LlmConfig, EmbedderConfig, VectorStoreConfig
+from qdrant_client import QdrantClient
+
+logger = logging.getLogger(__name__)
+
+MEMORY_HEALTH_INTERVAL = float(os.getenv("MEMORY_HEALTH_INTERVAL", "60"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))
+
+
+def memory_config(qdrant: QdrantClient):
+    gemini_api_key = os.getenv("GOOGLE_API_KEY")
+    llm_config_data = {
+        'api_key': gemini_api_key,
+        'model': 'gemini-2.5-flash'
+    }
+
+    embed_config_data = {
+        'api_key': gemini_api_key,
+        'model': 'models/text-embedding-004'
+    }
+
+    qdrant_specific_config_data = {
+        "collection_name": "Dravina",
+        "client": qdrant,
+        "url": os.getenv('QDRANT_URL'),
+        "api_key": os.getenv('QDRANT_API_KEY'),
+        "on_disk": True,
+        "embedding_model_dims":768,
+    }
+
+    return MemoryConfig(
+        llm=LlmConfig(
+            provider='gemini',
+            config=llm_config_data
+        ),
+        embedder=EmbedderConfig(
+            provider='gemini',
+            config=embed_config_data
+        ),
+        vector_store=VectorStoreConfig(
+            provider='qdrant',
+            config=qdrant_specific_config_data
+        )
+    )
+
+
+class MemoryService:
+    '''
+    Process-wide mem0 client, built once and shared by every memory task.
+
+    The Qdrant client is kept alive so its HTTP connections are reused. The connection is
+    health checked at most every MEMORY_HEALTH_INTERVAL seconds, or on the next use after a
+    failure, and the clients are rebuilt when the check fails.
+    '''
+    def __init__(self, health_interval: float = MEMORY_HEALTH_INTERVAL):
+        self.health_interval = health_interval
+        self._memory = None
+        self._qdrant = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._qdrant = QdrantClient(
+            url=os.getenv('QDRANT_URL'),
+            api_key=os.getenv('QDRANT_API_KEY'),
+            timeout=QDRANT_TIMEOUT
+        )
+        self._memory = Memory(config=memory_config(self._qdrant))
+        self._checked_at = time.monotonic()
+
+    def _healthy(self):
+        try:
+            self._qdrant.get_collections()
+            return True
+        except Exception as e:
+            logger.error(f"Qdrant health check failed: {e}")
+            return False
+
+    def client(self):
+        with self._lock:
+            if self._memory is None:
+                self._connect()
+            elif time.monotonic() - self._checked_at > self.health_interval:
+                if self._healthy():
+                    self._checked_at = time.monotonic()
+                else:
+                    self.close()
+                    self._connect()
+            return self._memory
+
+    def mark_failed(self):
+        '''Force a health check on the next use.'''
+        with self._lock:
+            self._checked_at = 0.0
+
+    def close(self):
+        if self._qdrant is not None:
+            try:
+                self._qdrant.close()
+            except Exception as e:
+                logger.error(f"Error closing Qdrant client: {e}")
+        self._memory = None
+        self._qdrant = None
+
+
+service = MemoryService()
@@ -0,0 +1,85 @@
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def normalise_query(query: str) -> str:
+    '''Lower case the query and collapse whitespace so trivially different repeats share an entry.'''
+    return re.sub(r"\s+", " ", str(query)).strip().lower()
+
+def cache_version(*parts: str) -> str:
+    '''Version of the cached results, e.g. a hash of the prompt and the model name.'''
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+class ProfileCache:
+    '''
+    Memoised profile analysis keyed on the normalised query.
+
+    Recent results are held in an in-process LRU. When a path is given they are also written
+    to SQLite so other workers and restarts can reuse them. Every key includes the version, so
+    changing the prompt or the model invalidates the old entries, which are also dropped from
+    the store on start up.
+    '''
+    def __init__(self, version: str, capacity: int = 1024, path: str = None):
+        self.version = version
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "key TEXT PRIMARY KEY, version TEXT NOT NULL, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM profiles WHERE version != ?", (version,))
+            self._db.commit()
+
+    def key(self, query: str) -> str:
+        return cache_version(self.version, normalise_query(query))
+
+    def _remember(self, key: str, value: dict):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def get(self, query: str):
+        '''Cached analysis of the query as a dictionary, None on a miss.'''
+        key = self.key(query)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None and self._db is not None:
+                row = self._db.execute("SELECT value FROM profiles WHERE key = ?", (key,)).fetchone()
+                if row:
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+            elif value is not None:
+                self._entries.move_to_end(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, query: str, value: dict):
+        key = self.key(query)
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO profiles (key, version, value, created_at) VALUES (?, ?, ?, ?)",
+                    (key, self.version, json.dumps(value), time.time())
+                )
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
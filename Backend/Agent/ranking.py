@@ -0,0 +1,93 @@
+import re
+from typing import List
+import numpy as np
+
+# Returns within this many percentage points, and expense ratios within this many, count as similar
+RETURN_TOLERANCE = 0.5
+EXPENSE_TOLERANCE = 0.05
+# Return points taken off a fund whose return decreased since the last scrape before comparing returns
+DECREASE_PENALTY = 2.0
+
+# Largest number of funds a single ranking returns
+MAX_TOP_K = 50
+
+# Weights of the weighted score, in the same priority order as the advice prompt
+WEIGHTS = {"return": 0.6, "expense": 0.25, "aum": 0.15, "decrease": 0.2}
+
+NUMBER_PATTERN = re.compile(r"[-+]?\d*\.?\d+")
+
+
+def _value(fund: dict, typed: str, display: str):
+    value = fund.get(typed)
+    if value is not None:
+        return float(value)
+    # Snapshots scraped before typed fields were added only have display strings
+    match = NUMBER_PATTERN.search(str(fund.get(display) or "").replace(",", ""))
+    return float(match.group()) if match else np.nan
+
+def _scaled(values: np.ndarray):
+    '''Min-max scale to [0, 1] with missing values at 0.'''
+    if np.all(np.isnan(values)):
+        return np.zeros_like(values)
+    low, high = np.nanmin(values), np.nanmax(values)
+    if high == low:
+        return np.where(np.isnan(values), 0.0, 1.0)
+    return np.nan_to_num((values - low) / (high - low), nan=0.0)
+
+
+class FundRanker:
+    '''
+    Ranks funds of one snapshot by return, then expense ratio, then AUM, avoiding decreased funds.
+
+    The metrics are held as NumPy arrays built once per snapshot, so ranking any subset is vectorised.
+    '''
+    def __init__(self, funds: List[dict]):
+        self.funds = funds
+        self.returns = np.array([_value(fund, "return_pct", "return") for fund in funds], dtype=float)
+        self.expense = np.array([_value(fund, "expense_ratio_pct", "expense ratio") for fund in funds], dtype=float)
+        self.aum = np.array([_value(fund, "aum_cr", "aum") for fund in funds], dtype=float)
+        self.decreased = np.array([bool(fund.get("decrease from last time")) for fund in funds], dtype=bool)
+
+    def scores(self, positions: np.ndarray):
+        '''Weighted score of each position, higher is better.'''
+        return (
+            WEIGHTS["return"] * _scaled(self.returns[positions])
+            + WEIGHTS["expense"] * _scaled(-self.expense[positions])
+            + WEIGHTS["aum"] * _scaled(np.log1p(self.aum[positions]))
+            - WEIGHTS["decrease"] * self.decreased[positions]
+        )
+
+    def rank(self, positions: List[int], k: int = 10, method: str = "lexicographic"):
+        '''
+        Top k of the given fund positions.
+
+        Args:
+            positions: Positions of candidate funds in the snapshot
+            k: Number of funds to return, clamped to 1..MAX_TOP_K
+            method: "lexicographic" compares return, with a penalty for decreased funds, then
+                expense ratio, then AUM using the similarity tolerances, "weighted" sorts by the
+                weighted score
+
+        Returns:
+            List of (position, score) pairs, best first. The score is the weighted score for
+            "weighted" and the share of candidates ranked at or below the fund for "lexicographic",
+            so it never increases down the list
+        '''
+        k = min(max(int(k), 1), MAX_TOP_K)
+        positions = np.asarray(positions, dtype=np.intp)
+        if positions.size == 0:
+            return []
+        if method == "weighted":
+            scores = self.scores(positions)
+            order = np.argsort(-scores, kind="stable")
+        else:
+            # Missing values sort last, np.lexsort uses the last key as the primary one
+            penalised = self.returns[positions] - DECREASE_PENALTY * self.decreased[positions]
+            returns = np.nan_to_num(np.floor(penalised / RETURN_TOLERANCE), nan=-np.inf)
+            expense = np.nan_to_num(np.floor(self.expense[positions] / EXPENSE_TOLERANCE), nan=np.inf)
+            aum = np.nan_to_num(self.aum[positions], nan=-np.inf)
+            order = np.lexsort((-aum, expense, -returns))
+            scores = np.empty(positions.size)
+            scores[order] = 1.0 - np.arange(positions.size) / positions.size
+        top = order[:k]
+        return [(int(positions[index]), round(float(scores[index]), 4)) for index in top]
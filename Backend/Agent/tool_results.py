@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Fields of each tool result the model needs, everything else is dropped before the result enters the conversation
+TOOL_FIELDS = {
+    "get_mutual_funds_set": ["title", "tags", "aum", "return", "expense ratio", "decrease from last time", "score"],
+}
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "1500"))
+
+# Rough token estimate, about four characters per token for this kind of JSON
+CHARS_PER_TOKEN = 4
+
+stats = {"calls": 0, "tokens_before": 0, "tokens_after": 0}
+_stats_lock = threading.Lock()
+
+
+def estimate_tokens(value):
+    return len(json.dumps(value, ensure_ascii=False, default=str)) // CHARS_PER_TOKEN + 1
+
+def project(name: str, result):
+    fields = TOOL_FIELDS.get(name)
+    if not fields or not isinstance(result, list):
+        return result
+    return [{field: item[field] for field in fields if field in item} if isinstance(item, dict) else item for item in result]
+
+def _truncate_text(value, max_chars: int):
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[:max_chars].rstrip() + "..."
+    if isinstance(value, dict):
+        return {key: _truncate_text(item, max_chars) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_truncate_text(item, max_chars) for item in value]
+    return value
+
+def fit(result, budget: int):
+    '''
+    Fit a result into a token budget.
+
+    Lists keep their leading items (tool results are ranked best first) and report how many were
+    omitted, other values have their long strings cut.
+    '''
+    if isinstance(result, list):
+        kept = []
+        used = estimate_tokens({"items": [], "omitted": len(result)})
+        for item in result:
+            cost = estimate_tokens(item)
+            if used + cost > budget:
+                break
+            kept.append(item)
+            used += cost
+        return {"items": kept, "omitted": len(result) - len(kept)}
+    max_chars = budget * CHARS_PER_TOKEN
+    while max_chars > 64 and estimate_tokens(result) > budget:
+        result = _truncate_text(result, max_chars)
+        max_chars //= 2
+    return result
+
+def shape(name: str, result, budget: int = TOOL_RESULT_TOKEN_BUDGET):
+    '''
+    Project a tool result to the fields the model needs and fit it into the token budget.
+
+    Returns:
+        The shaped result and the number of tokens saved
+    '''
+    before = estimate_tokens(result)
+    shaped = project(name, result)
+    if estimate_tokens(shaped) > budget:
+        shaped = fit(shaped, budget)
+    after = estimate_tokens(shaped)
+    with _stats_lock:
+        stats["calls"] += 1
+        stats["tokens_before"] += before
+        stats["tokens_after"] += after
+    if before > after:
+        logger.info(f"Shaped {name} result from ~{before} to ~{after} tokens")
+    return shaped, before - after
@@ -0,0 +1,152 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.chrome.service import Service as ChromeService
+from webdriver_manager.chrome import ChromeDriverManager
+from contextlib import contextmanager
+import threading
+import atexit
+import queue
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_FILE_PATH = os.path.join(BASE_DIR, "logs.txt")
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+#Function to return the chromedriver binary path, resolved once per process
+#Input -> Nothing
+#Output -> Path to the chromedriver binary
+def driver_path():
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            # CHROMEDRIVER_PATH skips the driver manager version check entirely
+            _driver_path = os.getenv("CHROMEDRIVER_PATH","") or ChromeDriverManager().install()
+        return _driver_path
+
+
+def chrome_options():
+    options = ChromeOptions()
+    options.add_argument("--start-maximized")
+    options.add_argument("--memory-pressure-off")
+    options.add_argument("--max_old_space_size=4096")
+    options.add_argument("--log-level=3")  # Suppresses most browser logs
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])  # Suppress DevTools logging
+    options.add_argument("--disable-background-networking")
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--headless=new")  # Use new headless mode (Chrome 109+)
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    return options
+
+
+class PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+
+#Pool of warm headless Chrome drivers which are leased to a scraper and returned afterwards
+#Drivers are health checked on lease and recycled after max_uses leases
+class BrowserPool:
+    def __init__(self, size:int = 2, max_uses:int = 20):
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._live = set()
+        self._closed = False
+
+    def _start(self):
+        if not os.path.exists(LOG_FILE_PATH):
+            with open(LOG_FILE_PATH, 'w') as f:
+                f.write('')
+        service = ChromeService(driver_path(), log_path=LOG_FILE_PATH)
+        pooled = PooledDriver(webdriver.Chrome(service=service, options=chrome_options()))
+        with self._lock:
+            self._live.add(pooled)
+        return pooled
+
+    def _destroy(self, pooled):
+        with self._lock:
+            self._live.discard(pooled)
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error quitting driver: {e}")
+
+    def _healthy(self, pooled):
+        try:
+            pooled.driver.execute_script("return 1;")
+            return len(pooled.driver.window_handles) > 0
+        except Exception:
+            return False
+
+    def _acquire(self):
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                return self._start()
+            if pooled.uses < self.max_uses and self._healthy(pooled):
+                return pooled
+            logger.info("Recycling chrome driver")
+            self._destroy(pooled)
+
+    def _release(self, pooled, broken:bool):
+        if broken or self._closed or pooled.uses >= self.max_uses:
+            self._destroy(pooled)
+            return
+        try:
+            pooled.driver.delete_all_cookies()
+            pooled.driver.get("about:blank")
+        except Exception:
+            self._destroy(pooled)
+            return
+        self._idle.put(pooled)
+
+    #Lease a driver for the duration of the with block
+    @contextmanager
+    def lease(self):
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+        self._slots.acquire()
+        pooled = None
+        broken = False
+        try:
+            pooled = self._acquire()
+            pooled.uses += 1
+            yield pooled.driver
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            if pooled is not None:
+                self._release(pooled, broken)
+            self._slots.release()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._destroy(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            live = list(self._live)
+        for pooled in live:
+            self._destroy(pooled)
+
+
+pool = BrowserPool(
+    size=int(os.getenv("BROWSER_POOL_SIZE","2")),
+    max_uses=int(os.getenv("BROWSER_MAX_USES","20"))
+)
+atexit.register(pool.close)
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import time
+
+
+def empty_manifest():
+    return {"version":0,"updated_at":"","datasets":{}}
+
+def record_hash(record):
+    encoded = json.dumps(record, sort_keys=True, separators=(",",":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+#Function to split a scraped dataset into records keyed by a stable id
+#Input -> Source name and the scraped data
+#Output -> Dictionary of record id to record
+def dataset_records(name:str, data):
+    records = {}
+    if name == "RELATIVE_FUNDS":
+        for fund in data:
+            key = fund.get("title","")
+            # Titles can repeat across plans, keep every record
+            count = 1
+            while key in records:
+                count += 1
+                key = f"{fund.get('title','')}#{count}"
+            records[key] = fund
+    elif name == "RELATIVE_DETAILS":
+        for category, funds in data.items():
+            for fund, paragraph in funds.items():
+                records[f"{category}/{fund}"] = paragraph
+    elif name == "RELATIVE_STONES":
+        for metal, rows in data.items():
+            for row in rows:
+                records[f"{metal}/{row.get('date','')}"] = row
+    else:
+        records[""] = data
+    return records
+
+#Function to hash every record of a dataset
+#Output -> Dictionary of record id to content hash
+def record_hashes(records:dict):
+    return {key: record_hash(value) for key, value in records.items()}
+
+#Function to hash a whole dataset from its record hashes, independent of record order
+def dataset_hash(hashes:dict):
+    digest = hashlib.sha256()
+    for key in sorted(hashes):
+        digest.update(f"{key}:{hashes[key]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+#Function to find the records which changed between two versions
+#Output -> List of changed or added record ids and list of removed record ids
+def diff_hashes(old:dict, new:dict):
+    changed = [key for key, value in new.items() if old.get(key) != value]
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+def build_delta(name:str, records:dict, changed:list, removed:list, from_version:int, to_version:int):
+    return {
+        "dataset": name,
+        "from_version": from_version,
+        "to_version": to_version,
+        "upserted": {key: records[key] for key in changed},
+        "removed": removed,
+    }
+
+def timestamp():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
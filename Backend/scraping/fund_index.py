@@ -0,0 +1,115 @@
+import threading
+import scrape_data
+import tag_index
+
+#Sort keys accepted by the query endpoint mapped to the typed fields added by scrape_data.normalise_funds
+SORT_FIELDS = {
+    "return": ("return_pct", "return", scrape_data.parse_percent),
+    "expense_ratio": ("expense_ratio_pct", "expense ratio", scrape_data.parse_percent),
+    "aum": ("aum_cr", "aum", scrape_data.parse_aum),
+}
+DEFAULT_SORT = "-return,expense_ratio,-aum"
+MAX_LIMIT = 200
+
+
+def _number(fund:dict, key:str):
+    typed, display, parser = SORT_FIELDS[key]
+    value = fund.get(typed)
+    if value is None and fund.get(display):
+        # Datasets scraped before typed fields were added only have display strings
+        try:
+            value = parser(fund[display])
+        except ValueError:
+            value = None
+    return value
+
+
+#Index over one version of the fund list
+#Tag lookups, numeric values and the rank of every fund for each sort key are computed once when built
+class FundIndex:
+    def __init__(self, funds:list):
+        self.funds = funds
+        # Same tag normalisation and matching as the agent's snapshot index
+        self.tags = tag_index.TagIndex(funds)
+        self.values = {key: [_number(fund, key) for fund in funds] for key in SORT_FIELDS}
+        self.rank = {}
+        for key, values in self.values.items():
+            # Funds without a value rank last in either direction
+            order = sorted((position for position in range(len(funds)) if values[position] is not None), key=values.__getitem__)
+            rank = [None]*len(funds)
+            current, previous = -1, None
+            for position in order:
+                # Equal values share a rank so the next sort key breaks the tie
+                if values[position] != previous:
+                    current += 1
+                    previous = values[position]
+                rank[position] = current
+            self.rank[key] = rank
+
+    def _sort_key(self, sort:list):
+        def key(position):
+            parts = []
+            for name, descending in sort:
+                rank = self.rank[name][position]
+                if rank is None:
+                    parts.append((1, 0))
+                else:
+                    parts.append((0, -rank if descending else rank))
+            return parts
+        return key
+
+    #Function to filter, rank and project funds
+    #Input -> Tags matched "any" or "all", sort spec like "-return,expense_ratio", numeric thresholds, fields to keep and a limit
+    #Output -> Total number of matches and the projected funds
+    def query(self, tags=None, match:str = "any", sort:str = DEFAULT_SORT, min_return=None, max_expense_ratio=None, min_aum=None,
+              exclude_decreased:bool = False, fields=None, limit:int = 20):
+        if tags:
+            candidates = set(self.tags.positions(tags, match))
+        else:
+            candidates = set(range(len(self.funds)))
+
+        thresholds = (
+            ("return", min_return, lambda value, bound: value >= bound),
+            ("expense_ratio", max_expense_ratio, lambda value, bound: value <= bound),
+            ("aum", min_aum, lambda value, bound: value >= bound),
+        )
+        for key, bound, check in thresholds:
+            if bound is not None:
+                values = self.values[key]
+                candidates = {position for position in candidates if values[position] is not None and check(values[position], bound)}
+        if exclude_decreased:
+            candidates = {position for position in candidates if not self.funds[position].get("decrease from last time")}
+
+        spec = []
+        for name in (sort or "").split(","):
+            name = name.strip()
+            if not name:
+                continue
+            descending = name.startswith("-")
+            name = name.lstrip("-+")
+            if name not in SORT_FIELDS:
+                raise ValueError(f"Unknown sort key {name!r}, expected one of {list(SORT_FIELDS)}")
+            spec.append((name, descending))
+        matches = sorted(candidates, key=self._sort_key(spec))
+
+        limit = max(0, min(limit, MAX_LIMIT))
+        results = []
+        for position in matches[:limit]:
+            fund = self.funds[position]
+            results.append({field: fund.get(field) for field in fields} if fields else fund)
+        return len(matches), results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+#Function to return the index for a get_details value, rebuilt only when the cached dataset changes
+def index_for(value:dict):
+    global _index
+    with _index_lock:
+        if _index is not None and _index[0] is value:
+            return _index[1]
+    index = FundIndex(value["data"])
+    with _index_lock:
+        _index = (value, index)
+    return index
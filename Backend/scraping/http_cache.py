@@ -0,0 +1,82 @@
+import hashlib
+import gzip
+import json
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024
+
+
+#Serialised body of a dataset response with its strong ETag and compressed variants
+#Built once per dataset version and reused for every request of that version
+class RenderedBody:
+    def __init__(self, body:bytes, media_type:str, compressible:bool):
+        self.body = body
+        self.media_type = media_type
+        self.compressible = compressible and len(body) >= MIN_COMPRESS_SIZE
+        self.tag = hashlib.sha256(body).hexdigest()
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    #Each content coding has its own strong ETag, all sharing the dataset version tag
+    def etag(self, encoding:str = ""):
+        return f'"{self.tag}-{encoding}"' if encoding else f'"{self.tag}"'
+
+    def not_modified(self, if_none_match:str):
+        if not if_none_match:
+            return False
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate == "*":
+                return True
+            if candidate.startswith("W/"):
+                candidate = candidate[2:]
+            if candidate.strip('"').split("-")[0] == self.tag:
+                return True
+        return False
+
+    #Function to pick the best encoding the client accepts
+    #Output -> Encoding name ("br", "gzip" or "") and the body in that encoding
+    def negotiate(self, accept_encoding:str):
+        if not self.compressible:
+            return "", self.body
+        accepted = [value.split(";")[0].strip().lower() for value in (accept_encoding or "").split(",")]
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and (encoding != "br" or brotli is not None):
+                return encoding, self.variant(encoding)
+        return "", self.body
+
+    def variant(self, encoding:str):
+        with self._lock:
+            if encoding not in self._variants:
+                if encoding == "br":
+                    self._variants[encoding] = brotli.compress(self.body)
+                else:
+                    self._variants[encoding] = gzip.compress(self.body, compresslevel=6)
+            return self._variants[encoding]
+
+
+_rendered = {}
+_rendered_lock = threading.Lock()
+
+#Function to render a get_details value, reusing the rendered body while the cached value is unchanged
+#Input -> Dataset name and the value returned by supabase_connector.get_details_async
+#Output -> RenderedBody for the value
+def render(info:str, value:dict, media_type:str):
+    key = (info, value["format"])
+    with _rendered_lock:
+        cached = _rendered.get(key)
+        if cached and cached[0] is value:
+            return cached[1]
+    if value["format"] == "compact":
+        rendered = RenderedBody(value["data"], media_type, compressible=False)
+    else:
+        body = json.dumps({"message":"Data fetched successfully","data":value["data"]}, separators=(",",":")).encode('utf-8')
+        rendered = RenderedBody(body, media_type, compressible=True)
+    with _rendered_lock:
+        _rendered[key] = (value, rendered)
+    return rendered
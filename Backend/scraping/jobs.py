@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import copy
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+#Runs scrapes as background jobs with a single-flight lock
+#A trigger while a job is queued or running attaches to that job instead of starting another one
+class ScrapeJobs:
+    def __init__(self, run, sources, history:int = 20):
+        self._run = run
+        self._sources = list(sources)
+        self._history = history
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scrape")
+
+    #Function to start a scrape or attach to the one in progress
+    #Output -> Copy of the job and whether a new job was created
+    def trigger(self):
+        with self._lock:
+            if self._active is not None:
+                return copy.deepcopy(self._jobs[self._active]), False
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "duration": None,
+                "sources": {name: {"status":"pending"} for name in self._sources},
+            }
+            while len(self._jobs) > self._history:
+                self._jobs.popitem(last=False)
+            self._active = job_id
+            job = copy.deepcopy(self._jobs[job_id])
+        self._executor.submit(self._execute, job_id)
+        return job, True
+
+    def get(self, job_id:str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job else None
+
+    def _progress(self, job_id:str, name:str, result:dict):
+        with self._lock:
+            self._jobs[job_id]["sources"][name] = dict(result)
+
+    def _execute(self, job_id:str):
+        started = time.monotonic()
+        with self._lock:
+            self._jobs[job_id]["status"] = "running"
+            self._jobs[job_id]["started_at"] = time.time()
+        status = "failed"
+        try:
+            value = self._run(progress=lambda name, result: self._progress(job_id, name, result))
+            status = "succeeded" if value["status"] == 200 else "failed"
+        except Exception as e:
+            logger.error(f"Scrape job {job_id} failed: {e}")
+        finally:
+            with self._lock:
+                job = self._jobs[job_id]
+                job["status"] = status
+                job["finished_at"] = time.time()
+                job["duration"] = time.monotonic() - started
+                self._active = None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
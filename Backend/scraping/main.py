@@ -1,32 +1,102 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, Query
+from typing import List, Optional
+from fastapi.responses import JSONResponse
 import supabase_connector
+import compact_format
 import scrape_data
+import jobs
+import http_cache
+import fund_index
 import uvicorn
 
 app = FastAPI()
 
+# Scrapes are long and start Chrome, so only one runs at a time in the background
+scrape_jobs = jobs.ScrapeJobs(supabase_connector.update_details, supabase_connector.SOURCES)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await supabase_connector.close_async()
+    scrape_jobs.shutdown()
+
 #To be called by the cron job and to store values
+#Returns a job id immediately, a trigger during an active run attaches to that run
 @app.get("/run_scapre")
 async def run_scapre():
     try:
-        value = supabase_connector.update_details()
-        if value["status"] == 200:
-            return {"message":"Data updated successfully"},200
-        else:
-            return {"message":"Data not updated"},400
+        job, created = scrape_jobs.trigger()
+        message = "Scrape started" if created else "Scrape already running"
+        return JSONResponse({"message":message,"job_id":job["id"],"status":job["status"]}, status_code=202)
     except Exception as e:
-        return {"message": f"Error: {e}"},400
+        return JSONResponse({"message": f"Error: {e}"}, status_code=400)
 
+#Progress of a scrape job with the status, duration and size of each source
+@app.get("/jobs/{job_id}")
+async def get_job(job_id:str):
+    job = scrape_jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"message":"Job not found"}, status_code=404)
+    return job
+
+#Clients which send Accept: application/x-dravina-compact get the compact columnar format
+#Responses carry a strong ETag, If-None-Match is answered with 304 and large JSON bodies are compressed
 @app.get("/get_details/{info}")
-async def get_details(info:str):
+async def get_details(info:str, request:Request):
+    try:
+        fmt = "compact" if compact_format.MEDIA_TYPE in request.headers.get("accept","") else "json"
+        value = await supabase_connector.get_details_async(info, fmt)
+        if value["status"] != 200:
+            return JSONResponse({"message":"Data not fetched"}, status_code=400)
+
+        media_type = compact_format.MEDIA_TYPE if value["format"] == "compact" else "application/json"
+        rendered = http_cache.render(info, value, media_type)
+        headers = {"Vary":"Accept, Accept-Encoding","Cache-Control":"no-cache"}
+        if rendered.not_modified(request.headers.get("if-none-match","")):
+            headers["ETag"] = rendered.etag()
+            return Response(status_code=304, headers=headers)
+
+        encoding, body = rendered.negotiate(request.headers.get("accept-encoding",""))
+        headers["ETag"] = rendered.etag(encoding)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=media_type, headers=headers)
+    except Exception as e:
+        return JSONResponse({"message": f"Error: {e}"}, status_code=400)
+
+#Filtered and ranked funds served from an index built once per dataset version
+#Tags are normalised like the agent does, so "Large Cap Funds" and "large-cap" match the same funds
+#Example -> /query/mutual_funds?tags=large cap&tags=multi cap&match=any&sort=-return,expense_ratio&fields=title,return&limit=5
+@app.get("/query/mutual_funds")
+async def query_mutual_funds(
+    tags: Optional[List[str]] = Query(None),
+    match: str = "any",
+    sort: str = fund_index.DEFAULT_SORT,
+    min_return: Optional[float] = None,
+    max_expense_ratio: Optional[float] = None,
+    min_aum: Optional[float] = None,
+    exclude_decreased: bool = False,
+    fields: Optional[str] = None,
+    limit: int = 20
+):
     try:
-        value = supabase_connector.get_details(info)
-        if value["status"] == 200:
-            return {"message":"Data fetched successfully","data":value["data"]},200
-        else:
-            return {"message":"Data not fetched"},400
+        value = await supabase_connector.get_details_async("mutual_funds")
+        if value["status"] != 200:
+            return JSONResponse({"message":"Data not fetched"}, status_code=400)
+        index = fund_index.index_for(value)
+        total, funds = index.query(
+            tags=tags,
+            match=match,
+            sort=sort,
+            min_return=min_return,
+            max_expense_ratio=max_expense_ratio,
+            min_aum=min_aum,
+            exclude_decreased=exclude_decreased,
+            fields=[field.strip() for field in fields.split(",")] if fields else None,
+            limit=limit
+        )
+        return {"message":"Data fetched successfully","total":total,"data":funds}
     except Exception as e:
-        return {"message": f"Error: {e}"},400
+        return JSONResponse({"message": f"Error: {e}"}, status_code=400)
 
 @app.get("/")
 async def root():
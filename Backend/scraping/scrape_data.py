@@ -1,16 +1,16 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException
 from bs4 import BeautifulSoup
 import time
 import os
 import requests
 import logging
 import sys
+import re
+from collections import Counter
+import browser_pool
 
 
 logging.getLogger('WDM').propagate = False
@@ -20,104 +20,207 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+ETMONEY_MAX_PAGES = int(os.getenv("ETMONEY_MAX_PAGES","500"))
+ETMONEY_PAGE_TIMEOUT = float(os.getenv("ETMONEY_PAGE_TIMEOUT","15"))
+ETMONEY_SCRAPE_TIMEOUT = float(os.getenv("ETMONEY_SCRAPE_TIMEOUT","600"))
 
-#Function to return mutual funds details which we scrape
-#Input -> Nothing
-#Ouput -> List of dictionary of values of each mutual funds
-def mutual_funds():
-    try:
-        options = ChromeOptions()
-        options.add_argument("--start-maximized")
-        options.add_argument("--memory-pressure-off")
-        options.add_argument("--max_old_space_size=4096")
-        options.add_argument("--log-level=3")  # Suppresses most browser logs
-        options.add_experimental_option('excludeSwitches', ['enable-logging'])  # Suppress DevTools logging
-        options.add_argument("--disable-background-networking")
-        options.add_argument("--disable-background-timer-throttling")
-        options.add_argument("--headless=new")  # Use new headless mode (Chrome 109+)
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
+FUND_CARD_COUNT_SCRIPT = "return document.getElementsByClassName('mfFund-block').length;"
+LOAD_MORE_SCRIPT = "arguments[0].scrollIntoView({block: 'center'}); arguments[0].click();"
 
-        
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        log_file_path = os.path.join(BASE_DIR, "logs.txt")
-        if not os.path.exists(log_file_path):
-            with open(log_file_path, 'w') as f:
-                f.write('')
 
-        service = ChromeService(ChromeDriverManager().install(),log_path=log_file_path)
-        driver = webdriver.Chrome(service=service, options=options)
+#Function to keep clicking load more on the fund listing until every fund is loaded
+#Waits for the fund card count to go up after each click instead of sleeping
+#Input -> driver on the listing page, maximum number of clicks, seconds to wait per page and for the whole listing
+#Output -> Number of fund cards loaded
+def load_all_funds(driver, max_pages:int = ETMONEY_MAX_PAGES, page_timeout:float = ETMONEY_PAGE_TIMEOUT, total_timeout:float = ETMONEY_SCRAPE_TIMEOUT):
+    deadline = time.monotonic() + total_timeout
+    wait = WebDriverWait(driver, page_timeout)
+    wait.until(EC.presence_of_element_located((By.CLASS_NAME, "mfFund-block")))
 
-        driver.get("https://www.etmoney.com/mutual-funds/all-funds-listing")
-        wait = WebDriverWait(driver, 10)
-        total_funds = driver.find_element(By.CLASS_NAME, "total-hidden-funds-count").text.strip()
-        cnt = int(total_funds)//20
+    # The counter can be hidden, and .text is empty for hidden elements
+    total_text = driver.find_element(By.CLASS_NAME, "total-hidden-funds-count").get_attribute("textContent") or ""
+    total_text = "".join(ch for ch in total_text if ch.isdigit())
+    total_funds = int(total_text) if total_text else 0
 
-        for i in range(10):
-            try:
-                load_more = wait.until(EC.presence_of_element_located((By.ID, "load_more_nav")))
-
-                # Scroll into view
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", load_more)
-                time.sleep(1)  # Give time for scroll animation or transition
-
-                # Perform click via JS
-                driver.execute_script("arguments[0].click();", load_more)
-                time.sleep(2)  # Wait for new funds to load
-
-            except Exception as e:
-                print(e)
-                break
-        time.sleep(2)
-        results = []
-        fund_cards = driver.find_elements(By.CLASS_NAME, "mfFund-block")  # <-- update with actual class if different
-        for card in fund_cards:
+    loaded = driver.execute_script(FUND_CARD_COUNT_SCRIPT)
+    pages = 0
+    while pages < max_pages and (total_funds == 0 or loaded < total_funds):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning(f"Fund listing timed out after {pages} pages with {loaded}/{total_funds} funds")
+            break
+        load_more = driver.find_elements(By.ID, "load_more_nav")
+        if not load_more or not load_more[0].is_displayed():
+            break
+        driver.execute_script(LOAD_MORE_SCRIPT, load_more[0])
+        previous = loaded
+        try:
+            WebDriverWait(driver, min(page_timeout, remaining)).until(
+                lambda d: d.execute_script(FUND_CARD_COUNT_SCRIPT) > previous
+            )
+        except TimeoutException:
+            logger.warning(f"No new funds loaded after page {pages + 1}, stopping at {loaded}/{total_funds} funds")
+            break
+        loaded = driver.execute_script(FUND_CARD_COUNT_SCRIPT)
+        pages += 1
+    return loaded
+
+
+#Single script which reads every fund card in the browser and returns the raw fields as JSON
+#Mirrors the selectors used by extract_cards_by_element, cards missing a field are skipped
+FUND_CARDS_SCRIPT = """
+const results = [];
+const text = (el) => el ? (el.innerText || '').trim() : null;
+for (const card of document.getElementsByClassName('mfFund-block')) {
+    const titleElem = card.querySelector('.scheme-name a');
+    const image = card.querySelector('.item-value img');
+    const returns = card.querySelector('.sip-returns .item-value.active');
+    const expenseContainer = card.getElementsByClassName('mfFund-double')[0];
+    const expenseElem = expenseContainer ? expenseContainer.getElementsByClassName('item-value')[0] : null;
+    let aum = null;
+    for (const span of card.getElementsByTagName('span')) {
+        const isAum = Array.from(span.childNodes).some((n) => n.nodeType === Node.TEXT_NODE && n.nodeValue === 'AUM');
+        if (!isAum) continue;
+        for (let sib = span.nextElementSibling; sib && aum === null; sib = sib.nextElementSibling) {
+            if (sib.tagName === 'STRONG') {
+                const value = sib.querySelector(':scope > span');
+                if (value) aum = text(value);
+            }
+        }
+        if (aum !== null) break;
+    }
+    if (!titleElem || !image || !returns || !expenseElem || aum === null) continue;
+    results.push({
+        title: titleElem.getAttribute('title'),
+        tags: Array.from(card.querySelectorAll('.mf-category-tags a')).map((a) => a.getAttribute('title')),
+        aum: aum,
+        src: image.src,
+        return: text(returns),
+        expense: text(expenseElem)
+    });
+}
+return results;
+"""
+
+ETMONEY_EXTRACTION = os.getenv("ETMONEY_EXTRACTION","script")
+
+
+def fund_tag(val):
+    val = val.lower() if val else ""
+    if "thematic" in val:
+        val = "thematic"
+    elif "sectoral" in val:
+        val = "sectoral"
+    return val
+
+def fund_record(title, tags, aum, source, retval, expense_ratio):
+    return {
+        "title": title.lower() if title else "",
+        "tags": [fund_tag(tag) for tag in tags],
+        "aum": aum,
+        "decrease from last time": bool(source and 'red' in source),
+        "return": retval,
+        "expense ratio": expense_ratio
+    }
+
+NUMBER_PATTERN = re.compile(r"[-+]?\d*\.?\d+")
+
+def _parse_number(value:str):
+    match = NUMBER_PATTERN.search(value.replace(",",""))
+    if not match:
+        raise ValueError(f"No number in {value!r}")
+    return float(match.group())
+
+#Function to parse an AUM display string like "₹72,336 Cr" into crore
+def parse_aum(value:str):
+    number = _parse_number(value)
+    if re.search(r"(\d|\b)(l|lakhs?)\b", value.lower()):
+        return number/100
+    return number
+
+#Function to parse a percentage display string like "+21.79%" into a float
+def parse_percent(value:str):
+    return _parse_number(value)
+
+#Function to add typed numeric fields to each fund next to the display strings
+#Input -> List of fund dictionaries from the card extraction
+#Output -> Counter of parse failures per field, failed fields are set to None
+def normalise_funds(results):
+    failures = Counter()
+    for fund in results:
+        for field, target, parser in (
+            ("aum", "aum_cr", parse_aum),
+            ("return", "return_pct", parse_percent),
+            ("expense ratio", "expense_ratio_pct", parse_percent),
+        ):
             try:
-                title_elem = card.find_element(By.CSS_SELECTOR, ".scheme-name a")
-                title = title_elem.get_attribute("title")
-                title = title.lower() if title else ""
-                tag_elements = card.find_elements(By.CSS_SELECTOR, ".mf-category-tags a")
-                tags = []
-                for tag in tag_elements:
-                    val = tag.get_attribute("title")
-                    val = val.lower() if val else ""
-                    if "thematic" in val:
-                        val = "thematic"
-                    elif "sectoral" in val:
-                        val = "sectoral"
-                    tags.append(val)
-                    
-                aum_elem = card.find_element(By.XPATH, ".//span[text()='AUM']/following-sibling::strong/span")
-                aum = aum_elem.text
-                image = card.find_element(By.CSS_SELECTOR,'.item-value img')
-                source = image.get_attribute('src')
-                dec = False
-                if source and 'red' in source:
-                    dec = True
-                returns = card.find_element(By.CSS_SELECTOR, ".sip-returns .item-value.active")
-                retval = returns.text.strip()
-                expense_container = card.find_element(By.CLASS_NAME, "mfFund-double")
-                expense_elem = expense_container.find_element(By.CLASS_NAME, "item-value")
-                expense_ratio = expense_elem.text.strip()
-
-
-                listval = {
-                    "title": title,
-                    "tags": tags,
-                    "aum": aum,
-                    "decrease from last time": dec,
-                    "return": retval,
-                    "expense ratio": expense_ratio
-                }
-                results.append(listval)
-            except Exception as e:
-                pass
-        
-        if len(results) == 0:
-            raise Exception("No mutual funds obtained")
-        # # Close browser
-        driver.quit()
+                fund[target] = parser(fund.get(field) or "")
+            except ValueError:
+                fund[target] = None
+                failures[field] += 1
+        fund["decreased"] = bool(fund.get("decrease from last time"))
+    return failures
+
+#Function to read every loaded fund card with one execute_script round trip
+#Input -> driver on the listing page
+#Output -> List of dictionary of values of each mutual funds
+def extract_cards_by_script(driver):
+    cards = driver.execute_script(FUND_CARDS_SCRIPT) or []
+    return [
+        fund_record(card["title"], card["tags"], card["aum"], card["src"], card["return"], card["expense"])
+        for card in cards
+    ]
+
+#Function to read every loaded fund card element by element, one WebDriver call per field
+#Input -> driver on the listing page
+#Output -> List of dictionary of values of each mutual funds
+def extract_cards_by_element(driver):
+    results = []
+    fund_cards = driver.find_elements(By.CLASS_NAME, "mfFund-block")  # <-- update with actual class if different
+    for card in fund_cards:
+        try:
+            title_elem = card.find_element(By.CSS_SELECTOR, ".scheme-name a")
+            title = title_elem.get_attribute("title")
+            tag_elements = card.find_elements(By.CSS_SELECTOR, ".mf-category-tags a")
+            tags = [tag.get_attribute("title") for tag in tag_elements]
+            aum_elem = card.find_element(By.XPATH, ".//span[text()='AUM']/following-sibling::strong/span")
+            aum = aum_elem.text
+            image = card.find_element(By.CSS_SELECTOR,'.item-value img')
+            source = image.get_attribute('src')
+            returns = card.find_element(By.CSS_SELECTOR, ".sip-returns .item-value.active")
+            retval = returns.text.strip()
+            expense_container = card.find_element(By.CLASS_NAME, "mfFund-double")
+            expense_elem = expense_container.find_element(By.CLASS_NAME, "item-value")
+            expense_ratio = expense_elem.text.strip()
+            results.append(fund_record(title, tags, aum, source, retval, expense_ratio))
+        except Exception as e:
+            pass
+    return results
+
+#Function to return mutual funds details which we scrape
+#Input -> Extraction mode, "script" reads all cards in one call and "element" walks each card
+#Ouput -> List of dictionary of values of each mutual funds
+def mutual_funds(extraction:str = ETMONEY_EXTRACTION):
+    try:
+        with browser_pool.pool.lease() as driver:
+            driver.get("https://www.etmoney.com/mutual-funds/all-funds-listing")
+            loaded = load_all_funds(driver)
+            logger.info(f"Loaded {loaded} fund cards")
+            results = []
+            if extraction == "script":
+                try:
+                    results = extract_cards_by_script(driver)
+                except Exception as e:
+                    logger.warning(f"Script extraction failed, falling back to element extraction: {e}")
+            if len(results) == 0:
+                results = extract_cards_by_element(driver)
+
+            if len(results) == 0:
+                raise Exception("No mutual funds obtained")
+
+        failures = normalise_funds(results)
+        if failures:
+            logger.warning(f"Fund metric parse failures out of {len(results)} funds: {dict(failures)}")
         return results
     except Exception as e:
         print(f"outside {e}")
@@ -128,77 +231,48 @@ def mutual_funds():
 #Output -> Dictionary of values -> gold and silver -> Each having dictionaries of date and costs
 def gold_silver_details():
     try:
-        options = ChromeOptions()
-        options.add_argument("--start-maximized")
-        options.add_argument("--memory-pressure-off")
-        options.add_argument("--max_old_space_size=4096")
-        options.add_argument("--log-level=3")  # Suppresses most browser logs
-        options.add_experimental_option('excludeSwitches', ['enable-logging'])  # Suppress DevTools logging
-        options.add_argument("--disable-background-networking")
-        options.add_argument("--disable-background-timer-throttling")
-        options.add_argument("--headless=new")  # Use new headless mode (Chrome 109+)
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        log_file_path = os.path.join(BASE_DIR, "logs.txt")
-        if not os.path.exists(log_file_path):
-            with open(log_file_path, 'w') as f:
-                f.write('')
-
-        
         # Redirect stdout and stderr to log file
-        sys.stderr = open(log_file_path, 'a', encoding='utf-8')
-        
+        sys.stderr = open(browser_pool.LOG_FILE_PATH, 'a', encoding='utf-8')
 
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        log_file_path = os.path.join(BASE_DIR, "logs.txt")
-        if not os.path.exists(log_file_path):
-            with open(log_file_path, 'w') as f:
-                f.write('')
-
-        service = ChromeService(ChromeDriverManager().install(),log_path=log_file_path)
-
-        driver = webdriver.Chrome(service=service, options=options)
-        driver.get("https://www.goldpriceindia.com/gold-price-history.php")
-        tables = driver.find_elements(By.TAG_NAME,'tbody')
+        with browser_pool.pool.lease() as driver:
+            driver.get("https://www.goldpriceindia.com/gold-price-history.php")
+            tables = driver.find_elements(By.TAG_NAME,'tbody')
         
-        goldval = []
-        silverval = []
-        gold = True
-        for table in tables:
-            rows = table.find_elements(By.TAG_NAME,'tr')
-            if rows:
-                iterval = min(6,len(rows))
-                for row_count in range(iterval):
-                    value = {}
-                    value['date'] = ''
-                    value['cost'] = ''
-                    row = rows[row_count]
-                    tdele = row.find_elements(By.TAG_NAME,'td')
-                    for ele in tdele:
-                        spanval = ele.find_elements(By.TAG_NAME,'span')
-                        boldval = ele.find_elements(By.TAG_NAME,'b') or ele.find_elements(By.TAG_NAME,'strong')
-                        if spanval:
-                            value['date'] = spanval[0].text.strip()
-                        if boldval:
-                            value['cost'] = boldval[0].text.strip()
-
-                    if value['date']:
-                        if gold:
-                            goldval.append(value)
-                        else:
-                            silverval.append(value)
+            goldval = []
+            silverval = []
+            gold = True
+            for table in tables:
+                rows = table.find_elements(By.TAG_NAME,'tr')
+                if rows:
+                    iterval = min(6,len(rows))
+                    for row_count in range(iterval):
+                        value = {}
+                        value['date'] = ''
+                        value['cost'] = ''
+                        row = rows[row_count]
+                        tdele = row.find_elements(By.TAG_NAME,'td')
+                        for ele in tdele:
+                            spanval = ele.find_elements(By.TAG_NAME,'span')
+                            boldval = ele.find_elements(By.TAG_NAME,'b') or ele.find_elements(By.TAG_NAME,'strong')
+                            if spanval:
+                                value['date'] = spanval[0].text.strip()
+                            if boldval:
+                                value['cost'] = boldval[0].text.strip()
+
+                        if value['date']:
+                            if gold:
+                                goldval.append(value)
+                            else:
+                                silverval.append(value)
             
-                gold = False
+                    gold = False
         
-        final = {}
-        final['gold'] = goldval
-        final['silver'] = silverval
-        if len(goldval) == 0 or len(silverval) == 0:
-            raise Exception("There are no details obtained in gold/silver")
-        return final
+            final = {}
+            final['gold'] = goldval
+            final['silver'] = silverval
+            if len(goldval) == 0 or len(silverval) == 0:
+                raise Exception("There are no details obtained in gold/silver")
+            return final
     except Exception as e:
         print(e)
         return {}
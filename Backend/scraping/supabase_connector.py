@@ -3,9 +3,15 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 import os
 import json
-import requests
 import logging
+import time
+import asyncio
+import httpx
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import scrape_data
+import dataset_manifest
+import compact_format
 
 load_dotenv()
 
@@ -19,68 +25,296 @@ SUPABASE_URL:str = os.getenv("SUPABASE_URL","")
 SUPABASE_KEY:str = os.getenv("SUPABASE_KEY","")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def update_details():
+#Scraper for each dataset, keyed by the env variable holding its storage path
+SOURCES = {
+    "RELATIVE_DETAILS": scrape_data.mutual_fund_details,
+    "RELATIVE_FUNDS": scrape_data.mutual_funds,
+    "RELATIVE_STONES": scrape_data.gold_silver_details,
+}
+
+MANIFEST_PATH:str = os.getenv("RELATIVE_MANIFEST","manifest.json")
+DELTA_MAX_FRACTION:float = float(os.getenv("DELTA_MAX_FRACTION","0.2"))
+COMPACT_FORMAT:bool = os.getenv("COMPACT_FORMAT","1").lower() in ("1","true","yes")
+
+def upload_json(bucket_name:str, path:str, data):
+    content = json.dumps(data,indent=2).encode('utf-8')
+    supabase.storage.from_(bucket_name).update(
+        path,
+        content,
+        file_options={"content-type": "application/json", "upsert": "true",}
+    )
+    return len(content)
+
+def upload_compact(bucket_name:str, path:str, data):
+    content = compact_format.encode(data)
+    supabase.storage.from_(bucket_name).update(
+        path,
+        content,
+        file_options={"content-type": compact_format.MEDIA_TYPE, "upsert": "true",}
+    )
+    return len(content)
+
+#Function to check if a storage error means the object does not exist
+def object_missing(error:Exception):
+    status = str(getattr(error,"status","") or getattr(error,"statusCode",""))
+    code = str(getattr(error,"code","") or getattr(error,"error",""))
+    return status == "404" or code in ("not_found","NoSuchKey") or "not found" in str(error).lower()
+
+#Function to read a JSON object from storage
+#Input -> Bucket, path and the value to return when the object does not exist yet
+#Output -> Parsed JSON, any other error (network, auth, bad JSON) is raised
+def download_json(bucket_name:str, path:str, default):
+    try:
+        content = supabase.storage.from_(bucket_name).download(path)
+    except Exception as e:
+        if object_missing(e):
+            logger.info(f"{path} does not exist yet")
+            return default
+        raise
+    return json.loads(content)
+
+#Function to scrape one source and upload it as soon as the scrape finishes
+#Upload is skipped when the content hash is unchanged and a delta is written when only a few records changed
+#Input -> Source name from SOURCES, the bucket to upload into and the previous manifest entry of the source
+#Output -> Dictionary with status, duration in seconds, uploaded size in bytes and the new manifest entry
+def update_source(name:str, bucket_name:str, previous:dict):
+    started = time.monotonic()
+    try:
+        modified_data = SOURCES[name]()
+        if len(modified_data) == 0:
+            raise Exception("No data scraped")
+        path = os.getenv(name,"")
+        records = dataset_manifest.dataset_records(name, modified_data)
+        hashes = dataset_manifest.record_hashes(records)
+        content_hash = dataset_manifest.dataset_hash(hashes)
+        if previous.get("hash") == content_hash:
+            logger.info(f"{name} unchanged, skipping upload")
+            return {"status":200,"duration":time.monotonic()-started,"size":0,"skipped":True,"entry":previous}
+
+        size = upload_json(bucket_name, path, modified_data)
+        from_version = previous.get("version",0)
+        entry = {
+            "path": path,
+            "version": from_version+1,
+            "hash": content_hash,
+            "records": len(hashes),
+            "hashes": f"{path}.hashes.json",
+            "delta": None,
+            "compact": None,
+            "updated_at": dataset_manifest.timestamp(),
+        }
+        if previous.get("hash"):
+            try:
+                old_hashes = download_json(bucket_name, previous.get("hashes",""), {})
+            except Exception as e:
+                # Without the old hashes only the delta is skipped, the full dataset is still published
+                logger.warning(f"Could not read hashes of {name}, skipping delta: {e}")
+                old_hashes = {}
+            changed, removed = dataset_manifest.diff_hashes(old_hashes, hashes)
+            if old_hashes and len(changed)+len(removed) <= DELTA_MAX_FRACTION*len(hashes):
+                delta = dataset_manifest.build_delta(name, records, changed, removed, from_version, entry["version"])
+                entry["delta"] = f"{path}.delta.json"
+                size += upload_json(bucket_name, entry["delta"], delta)
+        if COMPACT_FORMAT:
+            entry["compact"] = f"{path}{compact_format.SUFFIX}"
+            size += upload_compact(bucket_name, entry["compact"], modified_data)
+        upload_json(bucket_name, entry["hashes"], hashes)
+        return {"status":200,"duration":time.monotonic()-started,"size":size,"skipped":False,"entry":entry}
+    except Exception as e:
+        logger.error(f"Error updating {name}: {e}")
+        return {"status":400,"duration":time.monotonic()-started,"error":str(e),"entry":previous}
+
+#Function to scrape and upload every source concurrently and then publish the manifest
+#A slow or failed source does not hold up or discard the others
+#Input -> Optional callback called with the source name and its result as each source progresses
+#Output -> Dictionary with overall status and the result of each source
+def update_details(progress=None):
     try:
         bucket_name = os.getenv("SUPABASE_BUCKET","")
-        names = ["RELATIVE_DETAILS","RELATIVE_FUNDS","RELATIVE_STONES"]
-        for i in names:
-            json_mod_data = {}
-            if i=="RELATIVE_DETAILS":
-                modified_data = scrape_data.mutual_fund_details()
-                if len(modified_data) != 0:
-                    json_mod_data = json.dumps(modified_data,indent=2)
-            elif i=="RELATIVE_FUNDS":
-                modified_data = scrape_data.mutual_funds()
-                if len(modified_data) != 0:
-                    json_mod_data = json.dumps(modified_data,indent=2)
-            elif i=="RELATIVE_STONES":
-                modified_data = scrape_data.gold_silver_details()
-                if len(modified_data) != 0:
-                    json_mod_data = json.dumps(modified_data,indent=2)
-            path = os.getenv(i,"")
-            result = supabase.storage.from_(bucket_name).update(
-                path,
-                json_mod_data.encode('utf-8'),
-                file_options={"content-type": "application/json", "upsert": "true",}
-            )
-
-        logger.info("Data updated successfully")
-        return {"status":200}
+        # Only a missing manifest starts from scratch, failing to read an existing one fails the run
+        # instead of publishing every dataset again as version 1
+        manifest = download_json(bucket_name, MANIFEST_PATH, dataset_manifest.empty_manifest())
+        results = {}
+        entries = {}
+        with ThreadPoolExecutor(max_workers=len(SOURCES)) as executor:
+            futures = {
+                executor.submit(update_source, name, bucket_name, manifest["datasets"].get(name,{})): name
+                for name in SOURCES
+            }
+            if progress:
+                for name in SOURCES:
+                    progress(name, {"status":"running"})
+            for future in as_completed(futures):
+                name = futures[future]
+                results[name] = future.result()
+                entries[name] = results[name].pop("entry")
+                logger.info(f"{name} finished with status {results[name]['status']} in {results[name]['duration']:.1f}s")
+                if progress:
+                    progress(name, results[name])
+
+        changed = False
+        for name, entry in entries.items():
+            if entry and entry != manifest["datasets"].get(name):
+                manifest["datasets"][name] = entry
+                changed = True
+        if changed:
+            manifest["version"] += 1
+            manifest["updated_at"] = dataset_manifest.timestamp()
+            upload_json(bucket_name, MANIFEST_PATH, manifest)
+            invalidate_cache()
+
+        if all(result["status"] == 200 for result in results.values()):
+            logger.info("Data updated successfully")
+            return {"status":200,"version":manifest["version"],"sources":results}
+        return {"status":400,"version":manifest["version"],"sources":results}
     except Exception as e:
         logger.error(f"Error updating details: {e}")
         return {"status":400}
 
 
-#Use the absolute path here
-def get_details(info:str):
+STORAGE_BUCKET:str = "scrape-dravina-data"
+DETAILS_CACHE_TTL:float = float(os.getenv("DETAILS_CACHE_TTL","300"))
+DETAILS_STALE_TTL:float = float(os.getenv("DETAILS_STALE_TTL","3600"))
+SIGNED_URL_EXPIRY:int = 3600  # 1 hour expiration
+SIGNED_URL_MARGIN:int = 300
+
+_details_cache = {}
+_refreshing = set()
+_signed_urls = {}
+_cache_lock = threading.Lock()
+
+#Function to map a dataset name to its storage path
+#Output -> Relative path in the bucket, empty if the dataset is unknown
+def dataset_path(info:str):
+    if info == "mutual_funds":
+        # abs_path = os.getenv("FUNDS_BUCKET_URL","")
+        return os.getenv("RELATIVE_FUNDS","")
+    elif info == "mutual_funds_details":
+        # abs_path = os.getenv("DETAILS_BUCKET_URL","")
+        return os.getenv("RELATIVE_DETAILS","")
+    elif info == "precious_stone_details":
+        # abs_path = os.getenv("STONES_BUCKER_URL","")
+        return os.getenv("RELATIVE_STONES","")
+    elif info == "manifest":
+        return MANIFEST_PATH
+    return ""
+
+#Function to return a signed URL for a path, reused until shortly before it expires
+def signed_url(path:str):
+    with _cache_lock:
+        cached = _signed_urls.get(path)
+    if cached and cached[1] - SIGNED_URL_MARGIN > time.time():
+        return cached[0]
+    signed = supabase.storage.from_(STORAGE_BUCKET).create_signed_url(
+        f"{path}",
+        expires_in=SIGNED_URL_EXPIRY
+    )
+    with _cache_lock:
+        _signed_urls[path] = (signed["signedURL"], time.time()+SIGNED_URL_EXPIRY)
+    return signed["signedURL"]
+
+def _store(key, value):
+    if value["status"] == 200:
+        with _cache_lock:
+            _details_cache[key] = {"value":value,"fetched_at":time.monotonic()}
+
+#Function to look a dataset up in the cache
+#Output -> Cached value or None on a miss, and whether the caller should start a background refresh
+def _lookup(key):
+    with _cache_lock:
+        entry = _details_cache.get(key)
+        if not entry:
+            return None, False
+        age = time.monotonic() - entry["fetched_at"]
+        if age < DETAILS_CACHE_TTL:
+            return entry["value"], False
+        if age < DETAILS_CACHE_TTL + DETAILS_STALE_TTL:
+            start = key not in _refreshing
+            _refreshing.add(key)
+            return entry["value"], start
+        return None, False
+
+#Function to drop every cached dataset, called once a scrape has uploaded new data
+def invalidate_cache():
+    with _cache_lock:
+        _details_cache.clear()
+
+
+STORAGE_IO_WORKERS:int = int(os.getenv("STORAGE_IO_WORKERS","8"))
+# The storage client is synchronous, signing runs here so it never blocks the event loop
+_io_executor = ThreadPoolExecutor(max_workers=STORAGE_IO_WORKERS, thread_name_prefix="storage-io")
+_async_http = None
+_background_tasks = set()
+
+def async_http():
+    global _async_http
+    if _async_http is None:
+        _async_http = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+    return _async_http
+
+async def _signed_url_async(path:str):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, signed_url, path)
+
+#Function to download a dataset from storage without going through the cache
+#Downloads with httpx so concurrent requests overlap their I/O
+#Input -> Dataset name and the format to serve, "json" or "compact"
+#Output -> Dictionary with status, data and the format actually served, compact data is returned as raw bytes
+async def fetch_details_async(info:str, fmt:str = "json"):
     try:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        # Generate a new signed URL
-        abs_path:str = ""
-        if info == "mutual_funds":
-            # abs_path = os.getenv("FUNDS_BUCKET_URL","")
-            abs_path = os.getenv("RELATIVE_FUNDS","")
-        elif info == "mutual_funds_details":
-            # abs_path = os.getenv("DETAILS_BUCKET_URL","")
-            abs_path = os.getenv("RELATIVE_DETAILS","")
-        elif info == "precious_stone_details":
-            # abs_path = os.getenv("STONES_BUCKER_URL","")
-            abs_path = os.getenv("RELATIVE_STONES","")
-        else:
+        abs_path = dataset_path(info)
+        if not abs_path:
             return {"status":400}
 
-        signed_url = supabase.storage.from_("scrape-dravina-data").create_signed_url(
-            f"{abs_path}", 
-            expires_in=3600  # 1 hour expiration
-        )
+        if fmt == "compact" and info != "manifest":
+            try:
+                response = await async_http().get(await _signed_url_async(f"{abs_path}{compact_format.SUFFIX}"))
+                response.raise_for_status()
+                return {"status":200,"data":response.content,"format":"compact"}
+            except Exception as e:
+                # Datasets written before COMPACT_FORMAT was enabled only exist as JSON
+                logger.warning(f"Compact {info} not available, serving JSON: {e}")
 
-        url = signed_url["signedURL"]
-        response = requests.get(url)
+        response = await async_http().get(await _signed_url_async(abs_path))
         response.raise_for_status()
-        if response.status_code != 200:
-            return {"status":400}
-        ans = response.json()
-        return {"status":200,"data":ans}
+        # Parsing the full fund list is CPU bound, keep it off the event loop
+        ans = await asyncio.get_running_loop().run_in_executor(_io_executor, response.json)
+        return {"status":200,"data":ans,"format":"json"}
     except Exception as e:
         logger.error(f"Error getting details: {e}")
         return {"status":400}
+
+async def _revalidate_async(key):
+    try:
+        _store(key, await fetch_details_async(*key))
+    finally:
+        with _cache_lock:
+            _refreshing.discard(key)
+
+#Use the absolute path here
+#Served from an in-process cache, entries older than DETAILS_CACHE_TTL are still served
+#for up to DETAILS_STALE_TTL while they are refreshed in the background
+#Input -> Dataset name and the format to serve, "json" or "compact"
+#Output -> Dictionary with status, data and the format actually served
+async def get_details_async(info:str, fmt:str = "json"):
+    key = (info, fmt)
+    value, revalidate = _lookup(key)
+    if revalidate:
+        task = asyncio.create_task(_revalidate_async(key))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    if value:
+        return value
+
+    value = await fetch_details_async(info, fmt)
+    _store(key, value)
+    return value
+
+async def close_async():
+    global _async_http
+    if _async_http is not None:
+        await _async_http.aclose()
+        _async_http = None
@@ -0,0 +1,83 @@
+import re
+from collections import defaultdict
+from typing import List
+
+# Shared tag normalisation, kept identical in Backend/Agent/tag_index.py and Backend/scraping/tag_index.py
+# because the agent and the scraping service are deployed separately
+
+# Different spellings of the same fund category, mapped to the form used in the scraped tags
+SYNONYMS = {
+    "largecap": "large cap",
+    "midcap": "mid cap",
+    "smallcap": "small cap",
+    "multicap": "multi cap",
+    "flexicap": "flexi cap",
+    "large and mid cap": "large & mid cap",
+    "balanced advantage": "dynamic asset allocation",
+    "tax saver": "elss",
+    "tax saving": "elss",
+    "government securities": "gilt",
+    "gsec": "gilt",
+    "ultrashort duration": "ultra short duration",
+    "fof": "fund of fund",
+}
+
+
+def _singular(word: str):
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+# Normalise a tag so "Large Cap Funds", "large-cap fund" and "large caps" all become "large cap"
+# A trailing fund word is kept when it is part of the category name, "Fund of Funds" becomes "fund of fund"
+def normalise_tag(tag: str):
+    tag = (tag or "").lower().replace("-", " ").replace("_", " ")
+    tag = re.sub(r"[^a-z0-9& ]", " ", tag)
+    words = tag.split()
+    if len(words) > 1 and words[-1] in ("fund", "funds") and words[-2] != "of":
+        words.pop()
+    if words:
+        words[-1] = _singular(words[-1])
+    tag = " ".join(words)
+    return SYNONYMS.get(tag, tag)
+
+
+# Inverted index from normalised tag to the positions of funds carrying it
+class TagIndex:
+    def __init__(self, funds: List[dict]):
+        self.funds = funds
+        postings = defaultdict(list)
+        for position, fund in enumerate(funds):
+            if not isinstance(fund, dict) or 'tags' not in fund:
+                continue
+            for tag in set(normalise_tag(tag) for tag in fund['tags']):
+                postings[tag].append(position)
+        self.postings = dict(postings)
+
+    def positions(self, tags: List[str], match: str = "any"):
+        '''
+        Positions of funds matching the tags.
+
+        Args:
+            tags: Tags in any spelling, they are normalised before lookup
+            match: "any" for funds with at least one tag, "all" for funds with every tag
+
+        Returns:
+            Sorted list of fund positions
+        '''
+        lists = [self.postings.get(normalise_tag(tag), []) for tag in tags if normalise_tag(tag)]
+        if not lists:
+            return []
+        if match == "all":
+            lists.sort(key=len)
+            selected = set(lists[0])
+            for postings in lists[1:]:
+                selected.intersection_update(postings)
+        else:
+            selected = set()
+            for postings in lists:
+                selected.update(postings)
+        return sorted(selected)
+
+    def query(self, tags: List[str], match: str = "any"):
+        return [self.funds[position] for position in self.positions(tags, match)]